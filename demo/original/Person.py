@@ -1,9 +1,9 @@
 from typing import Literal
 
-from tests.extensions.injection.test_add_dependency import Person
-
 
 class Person:
+    __slots__ = ("name", "age")
+
     def __init__(self, name: str, age: int) -> None:
         self.name = name
         self.age = age
@@ -11,5 +11,5 @@ class Person:
     def say(self):
         print(f"{self.name} is {self.age} years old")
 
-    def compareAge(self, other: Person) -> int:
+    def compareAge(self, other: "Person") -> int:
         return 1 if other.age >= self.age else 0
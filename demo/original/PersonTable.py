@@ -0,0 +1,91 @@
+from array import array
+from itertools import repeat
+from typing import Iterable, Iterator, Union
+import heapq
+import operator
+
+from .Person import Person
+
+
+class PersonTable:
+    __slots__ = ("_names", "_ages", "_offset")
+
+    def __init__(self, names: Iterable[str] = (), ages: Iterable[int] = ()) -> None:
+        self._names = list(names)
+        self._ages = memoryview(array("q", ages))
+        self._offset = 0
+        if len(self._names) != len(self._ages):
+            raise ValueError("names and ages must have the same length")
+
+    @classmethod
+    def from_persons(cls, persons: Iterable[Person]) -> "PersonTable":
+        names, ages = list(), array("q")
+        for person in persons:
+            names.append(person.name)
+            ages.append(person.age)
+        return cls(names, ages)
+
+    @classmethod
+    def _view(cls, base: "PersonTable", start: int, stop: int) -> "PersonTable":
+        table = cls.__new__(cls)
+        table._names = base._names
+        table._ages = base._ages[start:stop]
+        table._offset = base._offset + start
+        return table
+
+    def __len__(self) -> int:
+        return len(self._ages)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return self.take(range(start, stop, step))
+            return PersonTable._view(self, start, max(start, stop))
+        index = self._index(index)
+        return Person(self._names[self._offset + index], self._ages[index])
+
+    def _index(self, index: int) -> int:
+        index = operator.index(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("PersonTable index out of range")
+        return index
+
+    def __iter__(self) -> Iterator[Person]:
+        return map(self.__getitem__, range(len(self)))
+
+    @property
+    def ages(self) -> memoryview:
+        return self._ages
+
+    @property
+    def names(self) -> list:
+        return self._names[self._offset : self._offset + len(self)]
+
+    def take(self, indices: Iterable[int]) -> "PersonTable":
+        indices = list(map(self._index, indices))
+        return PersonTable(
+            (self._names[self._offset + i] for i in indices),
+            (self._ages[i] for i in indices),
+        )
+
+    def compare_age(self, other: Union[int, Person, "PersonTable"]) -> array:
+        if isinstance(other, PersonTable):
+            if len(other) != len(self):
+                raise ValueError("tables must have the same length")
+            other_ages = other.ages
+        else:
+            other_ages = repeat(other.age if isinstance(other, Person) else other)
+        return array("b", map(operator.le, self._ages, other_ages))
+
+    def argsort(self, descending: bool = False) -> list:
+        return sorted(range(len(self)), key=self._ages.__getitem__, reverse=descending)
+
+    def sort_by_age(self, descending: bool = False) -> "PersonTable":
+        return self.take(self.argsort(descending))
+
+    def top_k(self, k: int, oldest: bool = True) -> "PersonTable":
+        select = heapq.nlargest if oldest else heapq.nsmallest
+        return self.take(select(k, range(len(self)), key=self._ages.__getitem__))
@@ -0,0 +1,65 @@
+import pytest
+
+from original.Person import Person
+from original.PersonTable import PersonTable
+
+people = [Person("John", 36), Person("Ann", 31), Person("Bob", 38)]
+
+
+def test_from_persons():
+    table = PersonTable.from_persons(people)
+    assert len(table) == 3
+    assert table[1].name == "Ann"
+    assert table[-1].age == 38
+    assert [p.name for p in table] == ["John", "Ann", "Bob"]
+
+
+@pytest.mark.parametrize(
+    "other, expected",
+    [(36, [1, 1, 0]), (Person("Old", 40), [1, 1, 1])],
+)
+def test_compare_age_scalar(other, expected):
+    table = PersonTable.from_persons(people)
+    assert list(table.compare_age(other)) == expected
+
+
+def test_compare_age_table():
+    table = PersonTable.from_persons(people)
+    other = PersonTable.from_persons(people[1:] + people[:1])
+    expected = [a.compareAge(b) for a, b in zip(people, people[1:] + people[:1])]
+    assert list(table.compare_age(other)) == expected
+
+
+def test_sort_and_top_k():
+    table = PersonTable.from_persons(people)
+    assert table.sort_by_age().names == ["Ann", "John", "Bob"]
+    assert table.sort_by_age(descending=True).names == ["Bob", "John", "Ann"]
+    assert table.top_k(2).names == ["Bob", "John"]
+    assert table.top_k(1, oldest=False).names == ["Ann"]
+
+
+def test_view_is_zero_copy():
+    table = PersonTable.from_persons(people)
+    view = table[1:]
+    assert view.names == ["Ann", "Bob"]
+    assert view.ages.obj is table.ages.obj
+    assert view[0].name == "Ann"
+
+
+def test_negative_index_bounds():
+    table = PersonTable.from_persons(people)
+    view = table[1:]
+    assert table[-1].name == "Bob"
+    assert view[-2].name == "Ann"
+    assert view.take([-1]).names == ["Bob"]
+    with pytest.raises(IndexError):
+        table[-4]
+    with pytest.raises(IndexError):
+        view[-3]
+    with pytest.raises(IndexError):
+        view[2]
+
+
+def test_person_slots():
+    with pytest.raises(AttributeError):
+        Person("John", 36).email = "john@example.com"
@@ -0,0 +1,310 @@
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+import base64
+import hashlib
+import json
+import threading
+import time
+
+from git_action import git_blob_sha, git_session
+
+API_PREFIX = "/api/v4"
+
+
+def _version_key(name):
+    return [(0, int(p), "") if p.isdigit() else (1, 0, p) for p in name.split(".")]
+
+
+class fake_gitlab:
+    def __init__(
+        self, latency=0.0, default_per_page=20, rate_limit=None, retry_after=0
+    ):
+        self.latency = latency
+        self.default_per_page = default_per_page
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.groups = dict()
+        self.projects = dict()
+        self.calls: Counter = Counter()
+        self._lock = threading.Lock()
+        self._next_project_id = 1
+        self._commit_count = 0
+        self._window_start = time.monotonic()
+        self._window_calls = 0
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    @property
+    def api_calls(self):
+        return sum(self.calls.values())
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls.clear()
+
+    def start(self):
+        fake = self
+
+        class handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                fake._handle(self, "GET")
+
+            def do_HEAD(self):
+                fake._handle(self, "HEAD")
+
+            def do_POST(self):
+                fake._handle(self, "POST")
+
+            def do_PUT(self):
+                fake._handle(self, "PUT")
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def add_group(self, group_id, parent_id=None):
+        self.groups[group_id] = {"id": group_id, "parent_id": parent_id, "projects": []}
+        return group_id
+
+    def add_project(self, group_id, name, files=None, tags=None):
+        with self._lock:
+            project_id = self._next_project_id
+            self._next_project_id += 1
+        project = {
+            "id": project_id,
+            "name": name,
+            "path_with_namespace": f"group{group_id}/{name.lower()}",
+            "http_url_to_repo": f"{self.url}group{group_id}/{name.lower()}.git",
+            "files": {path: self._to_bytes(c) for path, c in (files or {}).items()},
+            "tags": dict(),
+            "head": None,
+        }
+        self.projects[project_id] = project
+        self.groups[group_id]["projects"].append(project_id)
+        project["head"] = self._new_commit()
+        for tag_name in tags or list():
+            project["tags"][str(tag_name)] = project["head"]
+        return project_id
+
+    @staticmethod
+    def _to_bytes(content):
+        return content if isinstance(content, bytes) else str(content).encode()
+
+    def _new_commit(self):
+        with self._lock:
+            self._commit_count += 1
+            return hashlib.sha1(b"commit %d" % self._commit_count).hexdigest()
+
+    def _rate_limited(self):
+        if self.rate_limit is None:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= 1.0:
+                self._window_start, self._window_calls = now, 0
+            self._window_calls += 1
+            return self._window_calls > self.rate_limit
+
+    def _handle(self, request, method):
+        split = urlsplit(request.path)
+        path = split.path
+        query = {k: v[-1] for k, v in parse_qs(split.query).items()}
+        length = int(request.headers.get("Content-Length") or 0)
+        raw_body = request.rfile.read(length) if length else b""
+        with self._lock:
+            self.calls[git_session.endpoint_key(method, path)] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self._rate_limited():
+            self._send(
+                request,
+                429,
+                {"message": "429 Too Many Requests"},
+                headers={"Retry-After": str(self.retry_after)},
+            )
+            return
+        body = dict()
+        if raw_body:
+            try:
+                body = json.loads(raw_body)
+            except ValueError:
+                body = {k: v[-1] for k, v in parse_qs(raw_body.decode()).items()}
+        try:
+            status, payload, headers = self._route(method, path, query, body)
+        except KeyError:
+            status, payload, headers = 404, {"message": "404 Not Found"}, dict()
+        if isinstance(payload, list):
+            payload, page_headers = self._paginate(request, split, query, payload)
+            headers = dict(headers, **page_headers)
+        self._send(request, status, payload, headers=headers, head=method == "HEAD")
+
+    def _paginate(self, request, split, query, items):
+        per_page = int(query.get("per_page", self.default_per_page))
+        page = int(query.get("page", 1))
+        total_pages = max(1, -(-len(items) // per_page))
+        headers = {
+            "X-Page": str(page),
+            "X-Per-Page": str(per_page),
+            "X-Total": str(len(items)),
+            "X-Total-Pages": str(total_pages),
+            "X-Next-Page": str(page + 1) if page < total_pages else "",
+        }
+        if page < total_pages:
+            next_query = dict(query, page=str(page + 1), per_page=str(per_page))
+            next_qs = "&".join(f"{k}={v}" for k, v in next_query.items())
+            host = request.headers.get("Host")
+            headers["Link"] = f'<http://{host}{split.path}?{next_qs}>; rel="next"'
+        return items[(page - 1) * per_page : page * per_page], headers
+
+    def _send(self, request, status, payload, headers=None, head=False):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        request.send_response(status)
+        if isinstance(payload, bytes):
+            request.send_header("Content-Type", "application/octet-stream")
+        else:
+            request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(0 if head else len(data)))
+        for key, value in (headers or dict()).items():
+            request.send_header(key, value)
+        request.end_headers()
+        if not head:
+            request.wfile.write(data)
+
+    def _project_json(self, project):
+        return {
+            k: project[k]
+            for k in ("id", "name", "path_with_namespace", "http_url_to_repo")
+        }
+
+    def _route(self, method, path, query, body):
+        if not path.startswith(API_PREFIX):
+            raise KeyError(path)
+        parts = path[len(API_PREFIX) + 1 :].split("/")
+        if parts[0] == "groups":
+            group_id = int(unquote(parts[1]))
+            if len(parts) == 2:
+                group = self.groups[group_id]
+                return 200, {"id": group_id, "parent_id": group["parent_id"]}, dict()
+            if parts[2] == "subgroups":
+                subgroups = [
+                    {"id": g["id"], "parent_id": g["parent_id"]}
+                    for g in self.groups.values()
+                    if g["parent_id"] == group_id
+                ]
+                return 200, subgroups, dict()
+            if parts[2] == "projects":
+                projects = [
+                    self._project_json(self.projects[pid])
+                    for pid in self.groups[group_id]["projects"]
+                ]
+                return 200, projects, dict()
+        if parts[0] == "projects":
+            project = self.projects[int(unquote(parts[1]))]
+            return self._route_project(method, project, parts[2:], query, body)
+        raise KeyError(path)
+
+    def _route_project(self, method, project, parts, query, body):
+        if len(parts) == 0:
+            return 200, self._project_json(project), dict()
+        if parts[:2] == ["repository", "tree"]:
+            tree = list()
+            dirs = set()
+            for path, content in sorted(project["files"].items()):
+                segments = path.split("/")
+                for i in range(1, len(segments)):
+                    dirs.add("/".join(segments[:i]))
+                tree.append(
+                    {"id": git_blob_sha(content), "path": path, "type": "blob"}
+                )
+            tree.extend({"id": "", "path": d, "type": "tree"} for d in sorted(dirs))
+            return 200, tree, dict()
+        if parts[:2] == ["repository", "tags"]:
+            return self._route_tags(method, project, parts[2:], query, body)
+        if parts[:2] == ["repository", "commits"] and method == "POST":
+            for action in body["actions"]:
+                content = action.get("content", "")
+                if action.get("encoding") == "base64":
+                    content = base64.b64decode(content)
+                if action["action"] == "delete":
+                    project["files"].pop(action["file_path"], None)
+                else:
+                    project["files"][action["file_path"]] = self._to_bytes(content)
+            project["head"] = self._new_commit()
+            return 201, {"id": project["head"]}, dict()
+        if parts[:2] == ["repository", "branches"]:
+            branch = {"name": unquote(parts[2]), "commit": {"id": project["head"]}}
+            return 200, branch, dict()
+        if parts[:2] == ["repository", "files"]:
+            file_path = unquote(parts[2])
+            if method in ("POST", "PUT"):
+                exists = file_path in project["files"]
+                if exists != (method == "PUT"):
+                    if method == "PUT":
+                        message = "A file with this name doesn't exist"
+                    else:
+                        message = "A file with this name already exists"
+                    return 400, {"message": message}, dict()
+                content = body.get("content", "")
+                if body.get("encoding") == "base64":
+                    content = base64.b64decode(content)
+                project["files"][file_path] = self._to_bytes(content)
+                project["head"] = self._new_commit()
+                return 200 if method == "PUT" else 201, {"file_path": file_path}, dict()
+            content = project["files"][file_path]
+            headers = {"X-Gitlab-Blob-Id": git_blob_sha(content)}
+            if len(parts) > 3 and parts[3] == "raw":
+                return 200, content, headers
+            return 200, {
+                "file_name": file_path.split("/")[-1],
+                "file_path": file_path,
+                "size": len(content),
+                "encoding": "base64",
+                "content": base64.b64encode(content).decode(),
+                "ref": query.get("ref"),
+                "blob_id": git_blob_sha(content),
+                "commit_id": project["head"],
+            }, headers
+        raise KeyError("/".join(parts))
+
+    def _route_tags(self, method, project, parts, query, body):
+        tags = project["tags"]
+        if method == "POST":
+            tag_name = str(body["tag_name"])
+            if tag_name in tags:
+                return 400, {"message": f"Tag {tag_name} already exists"}, dict()
+            tags[tag_name] = project["head"]
+            return 201, {"name": tag_name, "commit": {"id": project["head"]}}, dict()
+        if len(parts) == 1:
+            tag_name = unquote(parts[0])
+            return 200, {"name": tag_name, "commit": {"id": tags[tag_name]}}, dict()
+        names = list(tags)
+        if query.get("order_by") == "version":
+            names.sort(key=_version_key, reverse=query.get("sort") != "asc")
+        return 200, [{"name": n, "commit": {"id": tags[n]}} for n in names], dict()
@@ -0,0 +1,217 @@
+from typing import Dict
+from urllib.parse import quote
+import asyncio
+import json
+import logging
+
+import httpx
+
+from git_action import (
+    chunk_actions,
+    detail,
+    encode_file_content,
+    git_blob_sha,
+    git_util,
+    iter_commit_actions,
+    project_registry,
+    retry_delay,
+    should_retry,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+
+class async_git_util:
+    branch_name = git_util.branch_name
+    git_hostname = git_util.git_hostname
+    COMMON_GROUP_ID = git_util.COMMON_GROUP_ID
+    DOMAIN_GROUP_ID = git_util.DOMAIN_GROUP_ID
+    top_group_id = git_util.top_group_id
+    commit_max_bytes = git_util.commit_max_bytes
+    commit_max_actions = git_util.commit_max_actions
+    tag_create_retries = git_util.tag_create_retries
+    http_max_retries = git_util.http_max_retries
+    http_backoff_base = git_util.http_backoff_base
+    http_backoff_max = git_util.http_backoff_max
+    max_concurrency = 32
+    per_page = 100
+
+    def __init__(self, personal_token=None, max_concurrency=None, transport=None):
+        self.personal_token = personal_token
+        self.project_id_map = project_registry()
+        concurrency = max_concurrency or self.max_concurrency
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._client = httpx.AsyncClient(
+            base_url=f"{self.git_hostname.rstrip('/')}/api/v4",
+            headers={"PRIVATE-TOKEN": personal_token or ""},
+            limits=httpx.Limits(
+                max_connections=concurrency, max_keepalive_connections=concurrency
+            ),
+            timeout=httpx.Timeout(60.0),
+            transport=transport,
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def _request(self, method, path, **kwargs) -> httpx.Response:
+        for attempt in range(self.http_max_retries + 1):
+            async with self._semaphore:
+                response = await self._client.request(method, path, **kwargs)
+            if attempt == self.http_max_retries or not should_retry(method, response):
+                return response
+            delay = retry_delay(
+                response, attempt, self.http_backoff_base, self.http_backoff_max
+            )
+            status = response.status_code
+            LOGGER.warning(f"{method} {path} RETURNED {status}, RETRY IN {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def _paginate(self, path, params=None):
+        params = dict(params or dict(), per_page=self.per_page)
+        page = "1"
+        while page:
+            response = await self._request("GET", path, params=dict(params, page=page))
+            response.raise_for_status()
+            for item in response.json():
+                yield item
+            page = response.headers.get("X-Next-Page")
+
+    @staticmethod
+    def _file_path(project_id, file_path):
+        encoded = quote(str(file_path), safe="")
+        return f"/projects/{project_id}/repository/files/{encoded}"
+
+    async def _fetch_project_id(self):
+        LOGGER.info("FETCH GIT REPO INFO")
+        group_id_list = [
+            group["id"]
+            async for group in self._paginate(f"/groups/{self.top_group_id}/subgroups")
+        ]
+
+        async def list_projects(group_id):
+            return [
+                project
+                async for project in self._paginate(f"/groups/{group_id}/projects")
+            ]
+
+        project_lists = await asyncio.gather(*map(list_projects, group_id_list))
+        for group_id, project_list in zip(group_id_list, project_lists):
+            is_common = True if group_id == self.COMMON_GROUP_ID else False
+            for proj_map in project_list:
+                proj_detail = detail(
+                    is_common,
+                    proj_map["id"],
+                    str(proj_map["name"]).lower(),
+                    proj_map["path_with_namespace"],
+                    proj_map["http_url_to_repo"],
+                )
+                self.project_id_map[proj_detail.name] = proj_detail
+
+    async def get_next_int_tag(self, project_id):
+        tags_path = f"/projects/{project_id}/repository/tags"
+        params = {"order_by": "version", "sort": "desc"}
+        async for tag in self._paginate(tags_path, params):
+            if str(tag["name"]).isdigit():
+                return int(tag["name"]) + 1
+        return 1
+
+    async def add_tag(self, project_id):
+        LOGGER.info("ADD TAG...")
+        next_tag = await self.get_next_int_tag(project_id)
+        for _ in range(self.tag_create_retries):
+            response = await self._request(
+                "POST",
+                f"/projects/{project_id}/repository/tags",
+                json={"tag_name": str(next_tag), "ref": self.branch_name},
+            )
+            if response.status_code == 400 and "already exists" in response.text:
+                LOGGER.warning(f"TAG {next_tag} ALREADY EXISTS, RETRY...")
+                next_tag += 1
+                continue
+            response.raise_for_status()
+            return next_tag
+        raise RuntimeError(
+            f"Could not allocate a tag after {self.tag_create_retries} attempts"
+        )
+
+    async def git_push(self, project_file_path, project_name, content):
+        LOGGER.info("GIT PUSH ...")
+        project_id = self.project_id_map.get(project_name).id
+        file_path = self._file_path(project_id, project_file_path)
+        response = await self._request(
+            "HEAD", file_path, params={"ref": self.branch_name}
+        )
+        if response.status_code not in (200, 404):
+            response.raise_for_status()
+        data = content if isinstance(content, bytes) else str(content).encode()
+        remote_blob = response.headers.get("X-Gitlab-Blob-Id")
+        if response.status_code == 200 and remote_blob == git_blob_sha(data):
+            LOGGER.info(f"{project_file_path} NOT CHANGED, SKIP PUSH AND TAG")
+            return None
+        payload = {"branch": self.branch_name, **encode_file_content(content)}
+        if response.status_code == 200:
+            payload["commit_message"] = "auto generate consolidate file"
+            response = await self._request("PUT", file_path, json=payload)
+        else:
+            payload["commit_message"] = (
+                "CI/CD: Auto-generated consolidated expectation suite"
+            )
+            response = await self._request("POST", file_path, json=payload)
+        response.raise_for_status()
+        return await self.add_tag(project_id)
+
+    async def list_branch_files(self, project_id):
+        params = {"ref": self.branch_name, "recursive": "true"}
+        return {
+            item["path"]: item["id"]
+            async for item in self._paginate(
+                f"/projects/{project_id}/repository/tree", params
+            )
+            if item["type"] == "blob"
+        }
+
+    async def git_push_multi_file(self, project_name, file_list):
+        LOGGER.info("GIT PUSH MULTI FILE...")
+        project_id = self.project_id_map.get(project_name).id
+        remote_blobs = await self.list_branch_files(project_id)
+        committed = 0
+        file_actions = iter_commit_actions(file_list, remote_blobs)
+        for files in chunk_actions(
+            file_actions, self.commit_max_bytes, self.commit_max_actions
+        ):
+            LOGGER.info(f"files are {[file['file_path'] for file in files]}")
+            response = await self._request(
+                "POST",
+                f"/projects/{project_id}/repository/commits",
+                json={
+                    "branch": self.branch_name,
+                    "commit_message": "auto generate consolidate file",
+                    "actions": files,
+                },
+            )
+            response.raise_for_status()
+            committed += len(files)
+        if committed == 0:
+            LOGGER.info("NOTHING CHANGED, SKIP COMMIT AND TAG")
+            return committed
+        await self.add_tag(project_id)
+        return committed
+
+    async def get_project_file_with_tag(self, project_id, tag_name, file_path) -> Dict:
+        tag_path = quote(str(tag_name), safe="")
+        response = await self._request(
+            "GET", f"/projects/{project_id}/repository/tags/{tag_path}"
+        )
+        response.raise_for_status()
+        commit_id = response.json()["commit"]["id"]
+        raw_path = f"{self._file_path(project_id, file_path)}/raw"
+        response = await self._request("GET", raw_path, params={"ref": commit_id})
+        response.raise_for_status()
+        return json.loads(response.content)
@@ -1,28 +1,183 @@
-from typing import List, Dict
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from fnmatch import fnmatch
+from typing import Iterable, Iterator, List, Dict
 from pathlib import Path
+import json
 import os
 
 
 BASE_LOCATION: Path = None
 TEST_LOCATION: Path = None
 DEMO_LIST: List = list()
+INDEX_FILE: Path = None
+DEFAULT_IGNORE = ("*.idea", "*cache")
+scan_report = namedtuple("scan_report", ["dirs", "added", "removed"])
+_INDEX_CACHE: Dict = dict()
 
 
 def set_location():
     global BASE_LOCATION
     global TEST_LOCATION
+    global INDEX_FILE
     BASE_LOCATION = Path(__file__).parent.parent
     TEST_LOCATION = Path(__file__).parent
+    INDEX_FILE = TEST_LOCATION / ".dir_index.json"
 
 
-def get_dir():
-    global DEMO_LIST
-    for x in Path(os.path.join(BASE_LOCATION, "demo")).iterdir():
-        print(str(x))
-        if x.name.endswith(".idea") or x.name.endswith("cache"):
+def _is_ignored(name: str, ignore: Iterable[str]) -> bool:
+    return any(fnmatch(name, pattern) for pattern in ignore)
+
+
+def _scan_one(path, ignore, quiet, follow_symlinks=True) -> Iterator[os.DirEntry]:
+    # directories that vanish or cannot be read are skipped, not fatal
+    try:
+        it = os.scandir(path)
+    except OSError:
+        return
+    with it:
+        while True:
+            try:
+                entry = next(it)
+            except StopIteration:
+                return
+            except OSError:
+                return
+            if not quiet:
+                print(entry.path)
+            if _is_ignored(entry.name, ignore):
+                continue
+            if entry.is_dir(follow_symlinks=follow_symlinks):
+                yield entry
+
+
+def scan_dirs(
+    root,
+    ignore: Iterable[str] = DEFAULT_IGNORE,
+    recursive: bool = False,
+    workers: int = None,
+    quiet: bool = True,
+) -> Iterator[os.DirEntry]:
+    ignore = tuple(ignore)
+    if not recursive:
+        yield from _scan_one(root, ignore, quiet)
+        return
+    if workers is None or workers <= 1:
+        stack = [root]
+        while stack:
+            for entry in _scan_one(stack.pop(), ignore, quiet, False):
+                yield entry
+                stack.append(entry.path)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+
+        def submit(path):
+            return executor.submit(
+                lambda: list(_scan_one(path, ignore, quiet, False))
+            )
+
+        pending = {submit(root)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for entry in future.result():
+                    yield entry
+                    pending.add(submit(entry.path))
+
+
+def _load_index(index_file) -> Dict:
+    if index_file in _INDEX_CACHE:
+        return _INDEX_CACHE[index_file]
+    try:
+        with open(index_file, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = dict()
+    _INDEX_CACHE[index_file] = index
+    return index
+
+
+def _save_index(index_file, index):
+    _INDEX_CACHE[index_file] = index
+    tmp_file = f"{index_file}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp_file, index_file)
+
+
+def scan_dirs_incremental(
+    root,
+    index_file=None,
+    ignore: Iterable[str] = DEFAULT_IGNORE,
+    recursive: bool = False,
+) -> scan_report:
+    root = os.fspath(root)
+    ignore = list(ignore)
+    index_file = os.fspath(index_file or INDEX_FILE)
+    index = _load_index(index_file)
+    options = {"root": root, "ignore": ignore, "recursive": recursive}
+    same_options = all(index.get(key) == value for key, value in options.items())
+    old_dirs = index.get("dirs", dict()) if same_options else dict()
+    previous = set(index.get("found", list())) if same_options else set()
+    new_dirs = dict()
+    found = list()
+    changed = not same_options
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        try:
+            stat = os.stat(path)
+        except OSError:
+            changed = True
             continue
-        if x.is_dir():
-            DEMO_LIST.append(x)
+        cached = old_dirs.get(path)
+        if (
+            cached is not None
+            and cached["mtime"] == stat.st_mtime_ns
+            and cached["inode"] == stat.st_ino
+        ):
+            children = cached["children"]
+        else:
+            children = [
+                entry.path
+                for entry in _scan_one(path, ignore, True, not recursive)
+            ]
+            changed = True
+        new_dirs[path] = {
+            "mtime": stat.st_mtime_ns,
+            "inode": stat.st_ino,
+            "children": children,
+        }
+        found.extend(children)
+        if recursive:
+            stack.extend(children)
+    found_set = set(found)
+    if changed or found_set != previous:
+        _save_index(index_file, dict(options, dirs=new_dirs, found=found))
+    return scan_report(
+        found, sorted(found_set - previous), sorted(previous - found_set)
+    )
+
+
+def get_dir(
+    ignore=DEFAULT_IGNORE, recursive=False, workers=None, quiet=False, incremental=False
+):
+    global DEMO_LIST
+    root = os.path.join(BASE_LOCATION, "demo")
+    if incremental:
+        report = scan_dirs_incremental(root, ignore=ignore, recursive=recursive)
+        if not quiet:
+            list(map(lambda x: print(f"+ {x}"), report.added))
+            list(map(lambda x: print(f"- {x}"), report.removed))
+        DEMO_LIST = [Path(x) for x in report.dirs]
+        return DEMO_LIST
+    DEMO_LIST = [
+        Path(entry.path)
+        for entry in scan_dirs(
+            root, ignore=ignore, recursive=recursive, workers=workers, quiet=quiet
+        )
+    ]
+    return DEMO_LIST
 
 
 def show():
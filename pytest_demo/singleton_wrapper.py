@@ -1,12 +1,160 @@
-def singleton_wrapper(cls):
-    instances = {}
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+import asyncio
+import functools
+import inspect
+import threading
+import warnings
 
+cache_info = namedtuple("cache_info", ["hits", "misses", "maxsize", "currsize"])
+_MISSING = object()
+
+
+def singleton_wrapper(cls=None, *, keyed=False, maxsize=128):
+    if cls is None:
+        return lambda c: singleton_wrapper(c, keyed=keyed, maxsize=maxsize)
+
+    instances = OrderedDict()
+    pending = dict()
+    building = dict()
+    first_args = dict()
+    lock = threading.Lock()
+    stats = {"hits": 0, "misses": 0}
+    state = {"generation": 0}
+
+    def make_key(args, kwargs):
+        if not keyed:
+            return cls
+        return args, tuple(sorted(kwargs.items()))
+
+    def same_arguments(first, args, kwargs):
+        first_args, first_kwargs = first
+        if len(first_args) != len(args) or first_kwargs.keys() != kwargs.keys():
+            return False
+        later = (*args, *(kwargs[name] for name in first_kwargs))
+        for old, new in zip((*first_args, *first_kwargs.values()), later):
+            if old is new:
+                continue
+            # arguments like numpy arrays compare elementwise, count them as changed
+            try:
+                if not bool(old == new):
+                    return False
+            except Exception:
+                return False
+        return True
+
+    def lookup(key, args, kwargs):
+        with lock:
+            instance = instances.get(key, _MISSING)
+            if instance is _MISSING:
+                return _MISSING
+            stats["hits"] += 1
+            if keyed:
+                instances.move_to_end(key)
+                return instance
+            first = first_args.get(key)
+        if (args or kwargs or first[0] or first[1]) and not same_arguments(
+            first, args, kwargs
+        ):
+            warnings.warn(
+                f"{cls.__name__} is already created, arguments are ignored",
+                stacklevel=3,
+            )
+        return instance
+
+    def store(key, instance, args, kwargs):
+        instances[key] = instance
+        stats["misses"] += 1
+        if keyed:
+            while maxsize is not None and len(instances) > maxsize:
+                instances.popitem(last=False)
+        else:
+            first_args[key] = (args, kwargs)
+
+    @functools.wraps(cls, updated=())
     def get_instance(*args, **kwargs):
-        if cls not in instances:
-            instances[cls] = cls(*args, **kwargs)
-        return instances[cls]
+        key = make_key(args, kwargs)
+        while True:
+            instance = lookup(key, args, kwargs)
+            if instance is not _MISSING:
+                return instance
+            with lock:
+                if key in instances:
+                    continue
+                entry = building.get(key)
+                if entry is None:
+                    entry = (threading.get_ident(), Future(), state["generation"])
+                    building[key] = entry
+                    break
+            if entry[0] == threading.get_ident():
+                raise RuntimeError(f"{cls.__name__} is already being created")
+            # another thread is constructing this key, wait without the lock
+            entry[1].result()
+        future = entry[1]
+        try:
+            instance = cls(*args, **kwargs)
+        except BaseException as e:
+            with lock:
+                if building.get(key) is entry:
+                    del building[key]
+            future.set_exception(e)
+            raise
+        with lock:
+            # a reset() during construction drops this instance from the cache
+            if entry[2] == state["generation"]:
+                store(key, instance, args, kwargs)
+            if building.get(key) is entry:
+                del building[key]
+        future.set_result(instance)
+        return instance
+
+    @functools.wraps(cls, updated=())
+    async def get_instance_async(*args, **kwargs):
+        key = make_key(args, kwargs)
+        instance = lookup(key, args, kwargs)
+        if instance is not _MISSING:
+            return instance
+        with lock:
+            generation = state["generation"]
+            future = pending.get(key)
+            if future is None:
+                future = asyncio.ensure_future(cls(*args, **kwargs))
+                pending[key] = future
+        try:
+            instance = await asyncio.shield(future)
+        finally:
+            with lock:
+                if pending.get(key) is future and future.done():
+                    del pending[key]
+        with lock:
+            if generation != state["generation"]:
+                return instance
+            if instances.get(key, _MISSING) is _MISSING:
+                store(key, instance, args, kwargs)
+            return instances[key]
+
+    def reset():
+        with lock:
+            state["generation"] += 1
+            instances.clear()
+            first_args.clear()
+            building.clear()
+            pending.clear()
+            stats["hits"] = stats["misses"] = 0
+
+    def get_cache_info():
+        with lock:
+            return cache_info(
+                stats["hits"],
+                stats["misses"],
+                maxsize if keyed else 1,
+                len(instances),
+            )
 
-    return get_instance
+    wrapper = get_instance_async if inspect.iscoroutinefunction(cls) else get_instance
+    wrapper.reset = reset
+    wrapper.cache_info = get_cache_info
+    return wrapper
 
 
 @singleton_wrapper
@@ -15,7 +163,8 @@ class Person:
         self.name = name
 
 
-p1 = Person("Alice")
-p2 = Person("Bob")
+if __name__ == "__main__":
+    p1 = Person("Alice")
+    p2 = Person("Bob")
 
-print(p1 is p2)  # True
+    print(p1 is p2)  # True
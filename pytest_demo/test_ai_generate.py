@@ -6,6 +6,9 @@ from unittest.mock import Mock, MagicMock, patch, call
 import os
 from pathlib import Path
 import json
+import subprocess
+import tempfile
+import threading
 
 from gitlab import Gitlab
 from gitlab.v4.objects import Project
@@ -14,7 +17,21 @@ from html5tagger.util import attributes
 sys.path.append(str(Path(__file__).parent))
 
 # Import the class we're testing
-from git_action import git_util
+from git_action import (
+    git_util,
+    git_session,
+    detail,
+    chunk_actions,
+    git_blob_sha,
+    iter_commit_actions,
+    iter_json_items,
+    json_item_stream,
+    json_sink,
+    project_registry,
+    prometheus_sink,
+    sync_result,
+    workspace_plan,
+)
 
 
 class TestGitUtil(unittest.TestCase):
@@ -46,7 +63,9 @@ class TestGitUtil(unittest.TestCase):
        self.assertEqual(self.git_util.personal_token, "mock_personal_token")
        self.assertEqual(self.git_util.personal_git, self.mock_gitlab)
        self.mock_gitlab_class.assert_called_once_with(
-           self.git_util.git_hostname, "mock_personal_token"
+           self.git_util.git_hostname,
+           "mock_personal_token",
+           session=self.git_util.http_session,
        )
 
     def test_singleton_pattern(self):
@@ -64,10 +83,12 @@ class TestGitUtil(unittest.TestCase):
         mock_tag2.attributes = {"name": "2"}
         mock_tag3 = MagicMock()
         mock_tag3.attributes = {"name": "not_a_number"}
-        mock_project.tags.list.return_value = [mock_tag1, mock_tag2, mock_tag3]
+        mock_project.tags.list.return_value = iter([mock_tag3, mock_tag2, mock_tag1])
         result = self.git_util.get_next_int_tag(mock_project)
         self.assertEqual(result, 3)
-        mock_project.tags.list.assert_called_once_with(ref_name="main")
+        mock_project.tags.list.assert_called_once_with(
+            order_by="version", sort="desc", iterator=True
+        )
 
     @patch("git_action.git_util")
     def test_get_next_int_tag_empty_list(self, mock_project_class):
@@ -106,7 +127,7 @@ class TestGitUtil(unittest.TestCase):
         self.git_util.add_tag = MagicMock()
         self.git_util.project_id_map = {"test_project": MagicMock(id=123)}
         self.git_util.add_tag_with_project_id(123)
-        self.mock_gitlab.projects.get.assert_called_once_with(123)
+        self.mock_gitlab.projects.get.assert_called_once_with(123, lazy=True)
         self.git_util.add_tag.assert_called_once_with(mock_project)
 
     @patch("git_action.git_util")
@@ -136,35 +157,60 @@ class TestGitUtil(unittest.TestCase):
 
     def test_git_push(self):
         mock_project = MagicMock()
-        mock_file = MagicMock()
         self.mock_gitlab.projects.get.return_value = mock_project
-        mock_project.files.get.return_value = mock_file
+        mock_project.files.head.return_value = {"X-Gitlab-Blob-Id": "0" * 40}
         self.git_util.project_id_map = {"test_project": MagicMock(id=123)}
         self.git_util.add_tag = MagicMock()
         self.git_util.git_push("test/path", "test_project", "test content")
-        self.mock_gitlab.projects.get.assert_called_once_with(123)
-        mock_project.files.get.assert_called_once_with(
+        self.mock_gitlab.projects.get.assert_called_once_with(123, lazy=True)
+        mock_project.files.head.assert_called_once_with(
             file_path="test/path", ref="main"
         )
-        self.assertEqual(mock_file.content, "test content")
-        mock_file.save.assert_called_once_with(
-            branch="main", commit_message="auto generate consolidate file"
+        mock_project.files.get.assert_not_called()
+        mock_project.files.update.assert_called_once_with(
+            "test/path",
+            {
+                "branch": "main",
+                "content": "test content",
+                "commit_message": "auto generate consolidate file",
+            },
         )
         self.git_util.add_tag.assert_called_once_with(project=mock_project)
 
     def test_git_push_create_file(self):
         self.mock_gitlab.projects.get.return_value = self.mock_project
-        self.mock_project.files.get.side_effect = gitlab.exceptions.GitlabGetError
+        self.mock_project.files.head.side_effect = gitlab.exceptions.GitlabHeadError(
+            response_code=404
+        )
         self.git_util.project_id_map = {"test_project": MagicMock(id=123)}
         self.git_util.add_tag = MagicMock()
         self.git_util.git_push("test/path", "test_project", "test content")
         self.mock_project.files.create.assert_called_once()
+        self.git_util.add_tag.assert_called_once()
+
+    def test_git_push_unchanged(self):
+        self.mock_gitlab.projects.get.return_value = self.mock_project
+        self.mock_project.files.head.return_value = {
+            "X-Gitlab-Blob-Id": git_blob_sha(b"test content")
+        }
+        self.git_util.project_id_map = {"test_project": MagicMock(id=123)}
+        self.git_util.add_tag = MagicMock()
+        result = self.git_util.git_push("test/path", "test_project", "test content")
+        self.assertIsNone(result)
+        self.mock_project.files.update.assert_not_called()
+        self.mock_project.files.create.assert_not_called()
+        self.git_util.add_tag.assert_not_called()
 
     def test_git_push_multi_file(self):
         mock_project = MagicMock()
         self.mock_gitlab.projects.get.return_value = mock_project
         self.git_util.project_id_map = {"test_project": MagicMock(id=123)}
-        self.git_util.check_file_exist = MagicMock(side_effect=[True, False])
+        mock_project.repository_tree.return_value = iter(
+            [
+                {"path": "test", "type": "tree"},
+                {"path": "test/path1", "type": "blob", "id": "0" * 40},
+            ]
+        )
         self.git_util.add_tag = MagicMock()
         mock_file1 = MagicMock()
         mock_file1.project_file_path = "test/path1"
@@ -174,10 +220,11 @@ class TestGitUtil(unittest.TestCase):
         mock_file2.project_file_path = "test/path2"
         mock_file2.content = "test content 2"
         self.git_util.git_push_multi_file("test_project", [mock_file1, mock_file2])
-        self.mock_gitlab.projects.get.assert_called_once_with(123)
-        self.git_util.check_file_exist.assert_has_calls(
-            [call(mock_project, "test/path1"), call(mock_project, "test/path2")]
+        self.mock_gitlab.projects.get.assert_called_once_with(123, lazy=True)
+        mock_project.repository_tree.assert_called_once_with(
+            ref="main", recursive=True, iterator=True
         )
+        mock_project.files.get.assert_not_called()
 
         mock_project.commits.create.assert_called_once_with(
             {
@@ -199,62 +246,77 @@ class TestGitUtil(unittest.TestCase):
         )
         self.git_util.add_tag.assert_called_once_with(project=mock_project)
 
-    @patch("git_action.subprocess.run")
-    @patch("git_action.os.path.join")
-    @patch("git_action.os.mkdir")
-    @patch("git_action.Path")
-    def test_clone_repo(self, mock_path, mock_mkdir, mock_join, mock_run):
-        mock_path_instance = MagicMock()
-        mock_path.return_value = mock_path_instance
-        mock_path_instance.parent.parent.parent = "/base/path"
-        mock_path_instance.exists.return_value = True
-        self.git_util._pre_setup = MagicMock()
-        self.git_util._existing_project_update = MagicMock()
-        self.git_util._clone = MagicMock()
-        self.git_util.clone_repo()
+    def test_clone_repo(self):
+        old = detail(False, 1, "old", "top/old", "mock")
+        new = detail(True, 2, "new", "top/new", "mock")
+        broken = detail(False, 3, "broken", "top/broken", "mock")
+        self.git_util._pre_setup = MagicMock(
+            return_value=workspace_plan([new], [old], ["/base/stray"], [broken])
+        )
+        self.git_util._update_existing_project = MagicMock(
+            return_value=sync_result("old", "pull", 0, 0.1, "")
+        )
+        self.git_util._clone_project = MagicMock(
+            return_value=sync_result("new", "clone", 0, 0.1, "")
+        )
+        results = self.git_util.clone_repo(incremental=True)
         self.git_util._pre_setup.assert_called_once()
-        self.git_util._existing_project_update.assert_called_once()
-        self.git_util._clone.assert_called_once()
+        self.git_util._update_existing_project.assert_called_once_with(
+            old, incremental=True
+        )
+        self.git_util._clone_project.assert_called_once_with(new)
+        self.assertEqual(
+            [(r.name, r.action) for r in results],
+            [("old", "pull"), ("new", "clone"), ("broken", "corrupt")],
+        )
+        self.assertNotEqual(results[-1].returncode, 0)
 
     @patch("git_action.subprocess.run")
     def test_update_project_action(self, mock_run):
         self.git_util._update_project_action("/test/path")
         mock_run.assert_called_once()
 
-    @patch("git_action.Path")
-    @patch("git_action.os.path.join")
-    @patch("git_action.os.mkdir")
-    def test_pre_setup_paths_exist(self, mock_mkdir, mock_join, mock_path):
-        mock_common_path = MagicMock()
-        mock_domain_path = MagicMock()
-        mock_path.side_effect = [mock_common_path, mock_domain_path]
-        mock_common_path.exists.return_value = True
-        mock_domain_path.exists.return_value = True
-        mock_join.side_effect = ["/base/common", "/base/domain"]
-        self.git_util._pre_check = MagicMock()
-        self.git_util.base_location = "/base"
-        self.git_util._pre_setup()
-        mock_join.assert_has_calls(
-            [call("/base", "common_rule"), call("/base", "data_domain")]
-        )
-        self.git_util._pre_check.assert_has_calls(
-            [call(mock_common_path), call(mock_domain_path)]
-        )
-        mock_mkdir.assert_not_called()
-
-    @patch("git_action.Path")
-    @patch("git_action.os.path.join")
-    @patch("git_action.os.mkdir")
-    def test_pre_setup_paths_dont_exist(self, mock_mkdir, mock_join, mock_path):
-        mock_common_path = MagicMock()
-        mock_domain_path = MagicMock()
-        mock_path.side_effect = [mock_common_path, mock_domain_path]
-        mock_common_path.exists.return_value = False
-        mock_domain_path.exists.return_value = False
-        mock_join.side_effect = ["/base/common", "/base/domain"]
-        self.git_util.base_location = "/base"
-        self.git_util._pre_setup()
-        mock_mkdir.assert_has_calls([call(mock_common_path), call(mock_domain_path)])
+    def test_pre_setup_paths_exist(self):
+        with tempfile.TemporaryDirectory() as base:
+            os.makedirs(os.path.join(base, "common_rule", "shared", ".git"))
+            os.makedirs(os.path.join(base, "data_domain", "domain", ".git"))
+            os.makedirs(os.path.join(base, "data_domain", "broken"))
+            os.makedirs(os.path.join(base, "data_domain", "stray", ".git"))
+            os.makedirs(os.path.join(base, "data_domain", "shared", ".git"))
+            open(os.path.join(base, "data_domain", "notes.txt"), "w").close()
+            self.git_util.base_location = base
+            self.git_util.project_id_map = {
+                "shared": detail(True, 1, "shared", "top/shared", "mock"),
+                "domain": detail(False, 2, "domain", "top/domain", "mock"),
+                "broken": detail(False, 3, "broken", "top/broken", "mock"),
+                "fresh": detail(False, 4, "fresh", "top/fresh", "mock"),
+            }
+            plan = self.git_util._pre_setup()
+            self.assertEqual([p.name for p in plan.to_clone], ["fresh"])
+            self.assertEqual([p.name for p in plan.to_update], ["shared", "domain"])
+            self.assertEqual([p.name for p in plan.corrupt], ["broken"])
+            self.assertEqual(
+                plan.orphaned,
+                [
+                    os.path.join(base, "data_domain", "shared"),
+                    os.path.join(base, "data_domain", "stray"),
+                ],
+            )
+            self.assertEqual(self.git_util.existing_project_list, plan.to_update)
+            self.assertIs(self.git_util.workspace_plan, plan)
+            self.assertEqual(len(self.git_util.project_id_map), 4)
+
+    def test_pre_setup_paths_dont_exist(self):
+        with tempfile.TemporaryDirectory() as base:
+            self.git_util.base_location = base
+            self.git_util.project_id_map = {
+                "domain": detail(False, 2, "domain", "top/domain", "mock")
+            }
+            plan = self.git_util._pre_setup()
+            self.assertTrue(os.path.isdir(os.path.join(base, "common_rule")))
+            self.assertTrue(os.path.isdir(os.path.join(base, "data_domain")))
+        domain = self.git_util.project_id_map["domain"]
+        self.assertEqual(plan, workspace_plan([domain], [], [], []))
 
     @patch("git_action.git_util")
     def test_get_project_file_with_tag(self, mock_project_class):
@@ -294,40 +356,728 @@ class TestGitUtil(unittest.TestCase):
         self.git_util._figure_detail(mock_project,True, detail)
         self.assertEqual(self.git_util.project_id_map["mock"].id, 1)
 
+    def _use_plan(self, to_clone=(), to_update=()):
+        plan = workspace_plan(list(to_clone), list(to_update), list(), list())
+        self.git_util._pre_setup = MagicMock(return_value=plan)
+        return plan
+
     @patch("git_action.subprocess.run")
     def test_clone(self, mock_run):
-        detail = namedtuple(
-            "detail", ["is_common", "git_url"]
-        )
-        self.git_util.project_id_map["mock"] = detail(is_common=True, git_url="mock")
-        self.git_util._clone()
+        self._use_plan(to_clone=[detail(True, 1, "mock", "mock", "mock")])
+        self.git_util.clone_repo()
         mock_run.assert_called_once()
 
-    def test_existing_project_update_failed(self):
-        self.git_util.existing_project_list = list()
-        self.git_util._existing_project_update()
-
+    def test_clone_repo_empty_plan(self):
+        self._use_plan()
+        self.assertEqual(self.git_util.clone_repo(), list())
 
     @patch("git_action.subprocess.run")
-    @patch("git_action.os.path.join")
-    def test_existing_project_update(self, mock_join, mock_run):
-        detail = namedtuple("detail", ["is_common", "name"])
-        self.git_util.existing_project_list = [detail(is_common=True, name="mock")]
-        mock_join.return_value = "mock"
-        self.git_util._existing_project_update()
-        mock_run.assert_called_once()
+    def test_update_from_plan(self, mock_run):
+        mock_run.return_value = MagicMock(returncode=0, stderr="")
+        self._use_plan(to_update=[detail(True, 1, "mock", "top/mock", "mock")])
+        self.git_util.base_location = "/base"
+        results = self.git_util.clone_repo()
+        mock_run.assert_called_once_with(
+            ["git", "pull"],
+            cwd=os.path.join("/base", "common_rule", "mock"),
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual([(r.name, r.action) for r in results], [("mock", "pull")])
 
     def test_pre_check_fail(self):
-        folder_path = Mock()
-        folder_path.iterdir.return_value = []
-        self.git_util._pre_check(folder_path)
+        with tempfile.TemporaryDirectory() as folder_path:
+            self.assertEqual(self.git_util._pre_check(folder_path), dict())
 
     def test_pre_check(self):
-        folder_path = Mock()
-        folder_path.iterdir.return_value = ["mock/common"]
-        self.git_util.project_id_map['common'] = "mock"
-        self.git_util._pre_check(folder_path)
-        self.assertIn("mock", self.git_util.existing_project_list)
+        with tempfile.TemporaryDirectory() as folder_path:
+            os.makedirs(os.path.join(folder_path, "common", ".git"))
+            os.makedirs(os.path.join(folder_path, "empty"))
+            open(os.path.join(folder_path, "file"), "w").close()
+            result = self.git_util._pre_check(folder_path)
+        self.assertEqual(result, {"common": True, "empty": False})
+
+    def test_fetch_project_id_parallel(self):
+        common_group = MagicMock(attributes={"id": git_util.COMMON_GROUP_ID})
+        domain_group = MagicMock(attributes={"id": git_util.DOMAIN_GROUP_ID})
+        common_proj = MagicMock(attributes={
+            "id": 1,
+            "name": "Common",
+            "path_with_namespace": "top/common",
+            "http_url_to_repo": "mock"
+        })
+        domain_proj = MagicMock(attributes={
+            "id": 2,
+            "name": "Domain",
+            "path_with_namespace": "top/domain",
+            "http_url_to_repo": "mock"
+        })
+        groups = {
+            git_util.top_group_id: MagicMock(),
+            git_util.COMMON_GROUP_ID: MagicMock(),
+            git_util.DOMAIN_GROUP_ID: MagicMock(),
+        }
+        groups[git_util.top_group_id].subgroups.list.return_value = [
+            common_group, domain_group
+        ]
+        groups[git_util.COMMON_GROUP_ID].projects.list.return_value = [common_proj]
+        groups[git_util.DOMAIN_GROUP_ID].projects.list.return_value = [domain_proj]
+        self.mock_gitlab.groups.get.side_effect = lambda gid, lazy=False: groups[gid]
+        git_util._fetch_project_id(self.git_util)
+        self.assertTrue(self.git_util.project_id_map["common"].is_common)
+        self.assertFalse(self.git_util.project_id_map["domain"].is_common)
+        groups[git_util.DOMAIN_GROUP_ID].projects.list.assert_called_once_with(all=True)
+
+    def test_fetch_project_id_cache(self):
+        group = MagicMock(attributes={"id": git_util.DOMAIN_GROUP_ID})
+        listing = [
+            MagicMock(attributes={
+                "id": 2,
+                "name": "Domain",
+                "path_with_namespace": "top/domain",
+                "http_url_to_repo": "mock",
+                "last_activity_at": "2026-01-01T00:00:00Z",
+            }),
+            MagicMock(attributes={
+                "id": 3,
+                "name": "Older",
+                "path_with_namespace": "top/older",
+                "http_url_to_repo": "mock",
+                "last_activity_at": "2025-01-01T00:00:00Z",
+            }),
+        ]
+
+        def list_projects(**kwargs):
+            if kwargs.get("iterator"):
+                ordered = sorted(
+                    listing,
+                    key=lambda p: p.attributes["last_activity_at"],
+                    reverse=True,
+                )
+                return MagicMock(total=len(listing), __iter__=lambda _: iter(ordered))
+            return list(listing)
+
+        projects = self.mock_gitlab.groups.get.return_value.projects
+        self.mock_gitlab.groups.get.return_value.subgroups.list.return_value = [group]
+        projects.list.side_effect = list_projects
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self.git_util.project_cache_dir = cache_dir
+            git_util._fetch_project_id(self.git_util)
+            self.git_util.project_id_map = dict()
+            self.mock_gitlab.groups.get.reset_mock()
+            git_util._fetch_project_id(self.git_util)
+            self.mock_gitlab.groups.get.assert_not_called()
+            self.assertEqual(self.git_util.project_id_map["older"].id, 3)
+
+            # unchanged group: one probe, no full listing
+            self.git_util.project_cache_ttl = 0
+            projects.list.reset_mock()
+            git_util._fetch_project_id(self.git_util)
+            self.assertEqual(projects.list.call_count, 1)
+            self.assertTrue(projects.list.call_args.kwargs["iterator"])
+            self.assertEqual(self.git_util.project_id_map["domain"].id, 2)
+
+            # deleting an older project keeps the latest activity but lowers
+            # the count, which forces a re-list of that group
+            del listing[1]
+            self.git_util.project_id_map = dict()
+            projects.list.reset_mock()
+            git_util._fetch_project_id(self.git_util)
+            self.assertEqual(projects.list.call_count, 2)
+            self.assertNotIn("older", self.git_util.project_id_map)
+            self.assertEqual(self.git_util.project_id_map["domain"].id, 2)
+
+    @patch("git_action.subprocess.run")
+    def test_clone_shallow_common(self, mock_run):
+        mock_run.return_value = MagicMock(returncode=0, stderr="")
+        self._use_plan(
+            to_clone=[
+                detail(True, 1, "common", "top/common", "mock"),
+                detail(False, 2, "domain", "top/domain", "mock"),
+            ]
+        )
+        self.git_util.base_location = "/base"
+        results = self.git_util.clone_repo(workers=2)
+        argv_list = sorted(c.args[0] for c in mock_run.call_args_list)
+        self.assertIn("--depth=1", argv_list[0])
+        self.assertIn("--filter=blob:none", argv_list[0])
+        self.assertEqual(len(argv_list[1]), 3)
+        self.assertEqual([r.returncode for r in results], [0, 0])
+        self.assertEqual({r.action for r in results}, {"clone"})
+        self.assertEqual(sorted(r.name for r in results), ["common", "domain"])
+
+    @patch("git_action.subprocess.run")
+    def test_update_project_action_argv(self, mock_run):
+        mock_run.return_value = MagicMock(returncode=1, stderr="conflict")
+        returncode, duration, output = self.git_util._update_project_action("/p")
+        mock_run.assert_called_once_with(
+            ["git", "pull"], cwd="/p", capture_output=True, text=True
+        )
+        self.assertEqual((returncode, output), (1, "conflict"))
+
+    def test_git_blob_sha(self):
+        self.assertEqual(
+            git_blob_sha(b""), "e69de29bb2d1d6434b8b29ae775ad8c2e48c5391"
+        )
+
+    def test_git_push_multi_file_chunked(self):
+        mock_project = MagicMock()
+        self.mock_gitlab.projects.get.return_value = mock_project
+        self.git_util.project_id_map = {"test_project": MagicMock(id=123)}
+        self.git_util.add_tag = MagicMock()
+        self.git_util.commit_max_actions = 2
+        mock_project.repository_tree.return_value = iter(
+            [{"path": "same", "type": "blob", "id": git_blob_sha(b"same")}]
+        )
+        file_gen = (
+            MagicMock(project_file_path=path, content=content)
+            for path, content in [
+                ("same", "same"),
+                ("a", "a"),
+                ("b", b"\x00\x01"),
+                ("c", "c"),
+            ]
+        )
+        committed = self.git_util.git_push_multi_file("test_project", file_gen)
+        self.assertEqual(committed, 3)
+        self.assertEqual(mock_project.commits.create.call_count, 2)
+        first_actions = mock_project.commits.create.call_args_list[0].args[0]["actions"]
+        self.assertEqual([a["file_path"] for a in first_actions], ["a", "b"])
+        self.assertEqual(first_actions[1]["encoding"], "base64")
+        self.git_util.add_tag.assert_called_once_with(project=mock_project)
+
+    def test_git_push_multi_file_unchanged(self):
+        mock_project = MagicMock()
+        self.mock_gitlab.projects.get.return_value = mock_project
+        self.git_util.project_id_map = {"test_project": MagicMock(id=123)}
+        self.git_util.add_tag = MagicMock()
+        mock_project.repository_tree.return_value = iter(
+            [{"path": "same", "type": "blob", "id": git_blob_sha(b"same")}]
+        )
+        file = MagicMock(project_file_path="same", content="same")
+        self.assertEqual(self.git_util.git_push_multi_file("test_project", [file]), 0)
+        mock_project.commits.create.assert_not_called()
+        self.git_util.add_tag.assert_not_called()
+
+    def test_add_tag_retry_on_conflict(self):
+        mock_project = MagicMock(id=123)
+        mock_project.tags.list.return_value = []
+        mock_project.tags.create.side_effect = [
+            gitlab.exceptions.GitlabCreateError(error_message="Tag 1 already exists"),
+            None,
+        ]
+        self.git_util.add_tag(mock_project)
+        mock_project.tags.create.assert_called_with({"tag_name": 2, "ref": "main"})
+        self.assertEqual(self.git_util.get_next_int_tag(mock_project), 3)
+
+    def test_add_tag_other_error(self):
+        mock_project = MagicMock(id=123)
+        mock_project.tags.list.return_value = []
+        mock_project.tags.create.side_effect = gitlab.exceptions.GitlabCreateError(
+            error_message="forbidden"
+        )
+        with self.assertRaises(gitlab.exceptions.GitlabCreateError):
+            self.git_util.add_tag(mock_project)
+
+    def test_get_project_file_with_tag_cached(self):
+        mock_project = MagicMock(id=123)
+        mock_project.tags.get.return_value.commit = {"id": "commit_id"}
+        mock_project.files.get.return_value.decode.return_value = b'{"key": 1}'
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self.git_util.file_cache_dir = cache_dir
+            first = self.git_util.get_project_file_with_tag(mock_project, "1", "a.json")
+            second = self.git_util.get_project_file_with_tag(mock_project, "1", "a.json")
+            self.assertEqual(first, second)
+            self.assertIsNot(first, second)
+            first["key"] = 2
+            self.assertEqual(
+                self.git_util.get_project_file_with_tag(mock_project, "1", "a.json"),
+                {"key": 1},
+            )
+            mock_project.tags.get.assert_called_once_with("1")
+            mock_project.files.get.assert_called_once_with("a.json", ref="commit_id")
+
+            self.git_util.clear_file_cache()
+            third = self.git_util.get_project_file_with_tag(mock_project, "1", "a.json")
+            self.assertEqual(third, {"key": 1})
+            mock_project.files.get.assert_called_once()
+
+    def test_file_cache_eviction(self):
+        self.git_util.file_cache_size = 1
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self.git_util.file_cache_dir = cache_dir
+            self.git_util.file_cache_max_bytes = 20
+            self.git_util._evict_file_cache = MagicMock(
+                wraps=self.git_util._evict_file_cache
+            )
+            self.git_util._file_cache_put(("c1", "a"), b"[1, 2, 3, 4]")
+            self.git_util._file_cache_put(("c1", "b"), b"[5]")
+            self.assertEqual(self.git_util._evict_file_cache.call_count, 1)
+            self.assertEqual(self.git_util._file_cache_bytes, 15)
+            self.git_util._file_cache_put(("c1", "c"), b"[6, 7, 8, 9]")
+            self.assertEqual(self.git_util._evict_file_cache.call_count, 2)
+            self.assertEqual(list(self.git_util._file_cache), [("c1", "c")])
+            self.assertEqual(len(list(Path(cache_dir).glob("*/*.json"))), 2)
+            self.assertLessEqual(self.git_util._file_cache_bytes, 20)
+
+    def test_get_project_files_with_tag(self):
+        ok_project = MagicMock(id=1)
+        ok_project.tags.get.return_value.commit = {"id": "c1"}
+        ok_project.files.get.return_value.decode.return_value = b'{"ok": true}'
+        bad_project = MagicMock(id=2)
+        bad_project.tags.get.side_effect = gitlab.exceptions.GitlabGetError("missing")
+        self.git_util.project_id_map = {"named": MagicMock(id=1)}
+        self.mock_gitlab.projects.get.return_value = ok_project
+        results = list(
+            self.git_util.get_project_files_with_tag(
+                [
+                    ("named", "1", "a.json"),
+                    (bad_project, "1", "a.json"),
+                ],
+                workers=2,
+            )
+        )
+        self.mock_gitlab.projects.get.assert_called_once_with(1, lazy=True)
+        ok_result = [result for result in results if result.project == "named"][0]
+        bad_result = [result for result in results if result.project is bad_project][0]
+        self.assertEqual(ok_result.content, {"ok": True})
+        self.assertIsNone(ok_result.error)
+        self.assertIsInstance(bad_result.error, gitlab.exceptions.GitlabGetError)
+
+    @patch("git_action.time.sleep")
+    @patch("git_action.requests.Session.request")
+    def test_git_session_retry_after(self, mock_request, mock_sleep):
+        limited = MagicMock(status_code=429, headers={"Retry-After": "2"})
+        ok = MagicMock(status_code=200, headers={})
+        mock_request.side_effect = [limited, ok]
+        session = git_session(max_retries=3)
+        response = session.request("get", "https://host/api/v4/projects/12/tags")
+        self.assertIs(response, ok)
+        self.assertGreaterEqual(mock_sleep.call_args.args[0], 2)
+        self.assertEqual(
+            session.endpoint_counter["GET /api/v4/projects/:id/tags"], 2
+        )
+        self.assertEqual(session.retry_counter["GET /api/v4/projects/:id/tags"], 1)
+
+    @patch("git_action.time.sleep")
+    @patch("git_action.requests.Session.request")
+    def test_git_session_no_retry_post_on_server_error(self, mock_request, mock_sleep):
+        failed = MagicMock(status_code=502, headers={})
+        mock_request.return_value = failed
+        session = git_session(max_retries=3)
+        response = session.request("post", "https://host/api/v4/projects/12/tags")
+        self.assertIs(response, failed)
+        mock_sleep.assert_not_called()
+
+    def test_measure(self):
+        mock_project = MagicMock(id=1)
+        mock_project.tags.list.return_value = []
+        with tempfile.TemporaryDirectory() as out_dir:
+            json_path = os.path.join(out_dir, "metrics.json")
+            with self.git_util.measure(sink=json_sink(json_path)) as metrics:
+                self.git_util.get_next_int_tag(mock_project)
+                self.git_util.http_session.on_request(
+                    "GET /api/v4/projects/:id/tags", 0.5, 100, 1
+                )
+            self.git_util.get_next_int_tag(mock_project)
+            with open(json_path) as f:
+                snapshot = json.load(f)
+        self.assertEqual(snapshot["method"]["get_next_int_tag"]["count"], 1)
+        api_stat = snapshot["api"]["GET /api/v4/projects/:id/tags"]
+        self.assertEqual((api_stat["bytes"], api_stat["retries"]), (100, 1))
+        self.assertEqual(metrics.snapshot(), snapshot)
+        self.assertEqual(
+            self.git_util.metrics.snapshot()["method"]["get_next_int_tag"]["count"], 2
+        )
+
+    def test_prometheus_sink(self):
+        snapshot = {
+            "api": {"GET /x": {"count": 2, "seconds": 0.5, "bytes": 10, "retries": 0}}
+        }
+        with tempfile.TemporaryDirectory() as out_dir:
+            prom_path = os.path.join(out_dir, "metrics.prom")
+            prometheus_sink(prom_path)(snapshot)
+            with open(prom_path) as f:
+                content = f.read()
+        self.assertIn('git_util_calls_total{kind="api",name="GET /x"} 2', content)
+        self.assertIn("# TYPE git_util_bytes_total counter", content)
+
+    def test_lazy_init(self):
+        git_util._instance = None
+        lazy_util = git_util(job_token="t", personal_token="t")
+        self.mock_gitlab.groups.get.assert_not_called()
+        lazy_util._fetch_project_id = MagicMock()
+        lazy_util.add_tag = MagicMock()
+        lazy_util.add_tag_with_project_id(123)
+        lazy_util._fetch_project_id.assert_not_called()
+        lazy_util.project_id_map.get("missing")
+        lazy_util.project_id_map.get("missing")
+        lazy_util._fetch_project_id.assert_called_once()
+
+    def test_reinit_skipped(self):
+        self.git_util.project_id_map = {"kept": MagicMock(id=1)}
+        same = git_util(job_token="other", personal_token="other")
+        self.assertIs(same, self.git_util)
+        self.assertEqual(same.job_token, "mock_job_token")
+        self.assertIn("kept", same.project_id_map)
+        self.mock_gitlab_class.assert_called_once()
+
+    def test_prefetch(self):
+        self.git_util.prefetch().join()
+        self.git_util._fetch_project_id.assert_called_once()
+        self.assertTrue(self.git_util._projects_loaded)
+
+    def test_project_registry(self):
+        registry = project_registry(
+            [
+                detail(True, 1, "common", "top/common", "mock"),
+                detail(False, 2, "domain", "top/domain", "mock"),
+            ]
+        )
+        self.assertEqual(registry.by_id(2).name, "domain")
+        self.assertEqual(registry.by_path("top/common").id, 1)
+        self.assertEqual([r.id for r in registry.common()], [1])
+        self.assertEqual([r.id for r in registry.domain()], [2])
+
+        snapshot = registry.copy()
+        registry["domain"] = detail(False, 2, "domain", "top/renamed", "mock")
+        registry["new"] = detail(False, 3, "new", "top/new", "mock")
+        registry.pop("common")
+        self.assertIsNone(registry.by_path("top/domain"))
+        self.assertIsNone(registry.by_id(1))
+        self.assertEqual(len(snapshot), 2)
+        changes = snapshot.diff(registry)
+        self.assertEqual([r.id for r in changes.added], [3])
+        self.assertEqual([r.id for r in changes.removed], [1])
+        self.assertEqual([r.git_url for r in changes.changed], ["top/renamed"])
+
+    @patch("git_action.subprocess.run")
+    def test_clone_repo_incremental(self, mock_run):
+        def run(argv, cwd=None, capture_output=True, text=True):
+            if argv[1] == "rev-parse":
+                head = "aaa" if cwd.endswith("fresh") else "old"
+                return MagicMock(returncode=0, stdout=f"{head}\n")
+            if argv[1] == "ls-remote":
+                return MagicMock(returncode=0, stdout="aaa\trefs/heads/main\n")
+            return MagicMock(returncode=0, stderr="")
+
+        mock_run.side_effect = run
+        self.git_util.base_location = "/base"
+        self._use_plan(
+            to_update=[
+                detail(False, 1, "fresh", "top/fresh", "mock"),
+                detail(False, 2, "stale", "top/stale", "mock"),
+            ]
+        )
+        results = self.git_util.clone_repo(incremental=True)
+        self.assertEqual(
+            sorted((r.name, r.action) for r in results),
+            [("fresh", "skip"), ("stale", "pull")],
+        )
+        pulls = [c for c in mock_run.call_args_list if c.args[0] == ["git", "pull"]]
+        self.assertEqual(len(pulls), 1)
+        self.assertTrue(pulls[0].kwargs["cwd"].endswith("stale"))
+
+    def test_remote_head_api(self):
+        self.git_util.remote_head_source = "api"
+        branch = self.mock_gitlab.projects.get.return_value.branches.get.return_value
+        branch.commit = {"id": "bbb"}
+        proj = detail(False, 7, "p", "top/p", "mock")
+        self.assertEqual(self.git_util._remote_head(proj, "/base/p"), "bbb")
+        self.mock_gitlab.projects.get.assert_called_once_with(7, lazy=True)
+
+    def test_get_project_file_with_tag_local_clone(self):
+        with tempfile.TemporaryDirectory() as base:
+            repo = os.path.join(base, git_util.DOMAIN_DIRNAME, "domain")
+            os.makedirs(os.path.join(repo, "dir"))
+            with open(os.path.join(repo, "dir", "a.json"), "w") as f:
+                f.write('{"local": true}')
+            git = ["git", "-c", "user.name=t", "-c", "user.email=t@t"]
+            for argv in (["init", "-q"], ["add", "."], ["commit", "-qm", "c"]):
+                subprocess.run(git + argv, cwd=repo, check=True)
+            subprocess.run(git + ["tag", "7"], cwd=repo, check=True)
+            self.git_util.base_location = base
+            self.git_util.project_id_map = {
+                "domain": detail(False, 5, "domain", "top/domain", "mock")
+            }
+            mock_project = MagicMock(id=5)
+            mock_project.files.get.return_value.decode.return_value = '{"api": 1}'
+            try:
+                local = self.git_util.get_project_file_with_tag(
+                    mock_project, "7", "dir/a.json"
+                )
+                fallback = self.git_util.get_project_file_with_tag(
+                    mock_project, "7", "dir/missing.json"
+                )
+            finally:
+                self.git_util.close_object_readers()
+        self.assertEqual(local, {"local": True})
+        self.assertEqual(fallback, {"api": 1})
+        mock_project.tags.get.assert_not_called()
+        mock_project.files.get.assert_called_once()
+
+    def test_project_cache(self):
+        self.git_util.project_id_map = {"test_project": MagicMock(id=123)}
+        full_project = self.git_util.project("test_project")
+        self.assertIs(self.git_util.project("TEST_PROJECT"), full_project)
+        self.assertIs(self.git_util._project_handle(123), full_project)
+        self.mock_gitlab.projects.get.assert_called_once_with(123)
+
+        self.git_util.project_ttl = 0
+        self.git_util._project_handle(123)
+        self.mock_gitlab.projects.get.assert_called_with(123, lazy=True)
+
+    def test_project_cache_eviction(self):
+        self.git_util.project_cache_size = 1
+        self.git_util._get_project(1)
+        self.git_util._get_project(2)
+        self.assertEqual(list(self.git_util._project_cache), [2])
+
+    def _publish_projects(self):
+        projects = {1: MagicMock(id=1), 2: MagicMock(id=2)}
+        for project in projects.values():
+            project.repository_tree.return_value = iter(
+                [{"path": "same", "type": "blob", "id": git_blob_sha(b"same")}]
+            )
+            project.tags.list.return_value = []
+        self.mock_gitlab.projects.get.side_effect = (
+            lambda pid, lazy=False: projects[pid]
+        )
+        self.git_util.project_id_map = {
+            "changed": detail(False, 1, "changed", "top/changed", "mock"),
+            "same": detail(False, 2, "same", "top/same", "mock"),
+        }
+        files = {
+            "changed": [
+                MagicMock(project_file_path="same", content="new"),
+                MagicMock(project_file_path="added", content="added"),
+            ],
+            "same": [MagicMock(project_file_path="same", content="same")],
+        }
+        return projects, files
+
+    def test_publish(self):
+        projects, files = self._publish_projects()
+        reports = {r.project_name: r for r in self.git_util.publish(files, workers=2)}
+        changed = reports["changed"]
+        self.assertEqual((changed.created, changed.updated), (1, 1))
+        self.assertEqual(reports["changed"].tag, 1)
+        self.assertIsNone(reports["same"].tag)
+        self.assertIn("commit", reports["changed"].timings)
+        projects[1].commits.create.assert_called_once()
+        projects[2].commits.create.assert_not_called()
+        projects[2].tags.create.assert_not_called()
+
+    def test_publish_tags_without_commit_barrier(self):
+        projects, files = self._publish_projects()
+        files["same"] = [MagicMock(project_file_path="same", content="new")]
+        tagged = threading.Event()
+        projects[2].tags.create.side_effect = lambda data: tagged.set()
+        projects[1].commits.create.side_effect = lambda data: self.assertTrue(
+            tagged.wait(5)
+        )
+        reports = self.git_util.publish(files, workers=2)
+        self.assertEqual([r.error for r in reports], [None, None])
+        self.assertEqual([r.tag for r in reports], [1, 1])
+
+    def test_publish_dry_run(self):
+        projects, files = self._publish_projects()
+        reports = self.git_util.publish(files, dry_run=True)
+        self.assertEqual([(r.created, r.updated) for r in reports], [(1, 1), (0, 0)])
+        self.assertEqual(
+            reports[0].actions, [("same", "update"), ("added", "create")]
+        )
+        self.assertEqual(reports[1].actions, [])
+        projects[1].commits.create.assert_not_called()
+        projects[1].tags.create.assert_not_called()
+
+    def test_publish_aborts_on_plan_error(self):
+        projects, files = self._publish_projects()
+        projects[2].repository_tree.side_effect = gitlab.exceptions.GitlabListError()
+        reports = self.git_util.publish(files)
+        self.assertTrue(all(r.error is not None for r in reports))
+        projects[1].commits.create.assert_not_called()
+
+    def test_iter_json_items(self):
+        doc = {
+            "meta": {"skip": ["a]", {"b": "}\\"}], "n": -1.5e3},
+            "expectations": [{"k": "é"}, 12345, None, [1, 2]],
+        }
+        data = json.dumps(doc, ensure_ascii=False).encode()
+        chunks = [data[i : i + 1] for i in range(len(data))]
+        self.assertEqual(list(iter_json_items(chunks)), list(doc.items()))
+        self.assertEqual(
+            list(iter_json_items(chunks, "expectations")), doc["expectations"]
+        )
+        self.assertEqual(list(iter_json_items(chunks, "meta.n")), [-1500.0])
+        self.assertEqual(list(iter_json_items(chunks, ["expectations", 3])), [1, 2])
+        with self.assertRaises(KeyError):
+            list(iter_json_items(chunks, "missing"))
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_items([b'{"expectations": [1, '], "expectations"))
+
+    def test_iter_json_items_flat_buffer(self):
+        item = json.dumps({"expectation_type": "x" * 100}).encode()
+
+        def chunks():
+            yield b'{"expectations": ['
+            for i in range(5000):
+                yield (b", " if i else b"") + item
+            yield b"]}"
+
+        stream = json_item_stream(chunks())
+        largest = 0
+        for _ in stream.items("expectations"):
+            largest = max(largest, len(stream._buffer))
+        self.assertLess(largest, 4 * len(item))
+
+    def test_iter_project_file_with_tag(self):
+        mock_project = MagicMock(id=123)
+        mock_project.tags.get.return_value.commit = {"id": "commit_id"}
+        mock_project.files.raw.return_value = iter([b'{"a": [1, ', b"2]}"])
+        result = self.git_util.iter_project_file_with_tag(
+            mock_project, "1", "a.json", path="a"
+        )
+        self.assertEqual(list(result), [1, 2])
+        mock_project.files.raw.assert_called_once_with(
+            "a.json",
+            ref="commit_id",
+            streamed=True,
+            iterator=True,
+            chunk_size=self.git_util.stream_chunk_size,
+        )
+        mock_project.files.get.assert_not_called()
+
+    def test_iter_project_file_with_tag_local_clone(self):
+        with tempfile.TemporaryDirectory() as base:
+            repo = os.path.join(base, git_util.DOMAIN_DIRNAME, "domain")
+            os.makedirs(repo)
+            with open(os.path.join(repo, "a.json"), "w") as f:
+                json.dump({"items": list(range(1000))}, f)
+            git = ["git", "-c", "user.name=t", "-c", "user.email=t@t"]
+            for argv in (["init", "-q"], ["add", "."], ["commit", "-qm", "c"]):
+                subprocess.run(git + argv, cwd=repo, check=True)
+            subprocess.run(git + ["tag", "7"], cwd=repo, check=True)
+            self.git_util.base_location = base
+            self.git_util.stream_chunk_size = 64
+            self.git_util.project_id_map = {
+                "domain": detail(False, 5, "domain", "top/domain", "mock")
+            }
+            mock_project = MagicMock(id=5)
+            try:
+                items = self.git_util.iter_project_file_with_tag(
+                    mock_project, "7", "a.json", path="items"
+                )
+                self.assertEqual(list(items), list(range(1000)))
+            finally:
+                self.git_util.close_object_readers()
+        mock_project.files.raw.assert_not_called()
+
+    def test_pre_setup_matches_checkout_path(self):
+        with tempfile.TemporaryDirectory() as base:
+            os.makedirs(os.path.join(base, "common_rule", "rule-engine", ".git"))
+            self.git_util.base_location = base
+            self.git_util.project_id_map = {
+                "rule engine": detail(
+                    True, 1, "rule engine", "top/common/rule-engine", "mock"
+                )
+            }
+            plan = self.git_util._pre_setup()
+            engine = self.git_util.project_id_map["rule engine"]
+            self.assertEqual(plan, workspace_plan([], [engine], [], []))
+            self.assertEqual(
+                self.git_util._checkout_path(engine),
+                os.path.join(base, "common_rule", "rule-engine"),
+            )
+
+    def test_get_project_files_with_tag_unknown_project(self):
+        known = MagicMock(id=1)
+        known.tags.get.return_value.commit = {"id": "c1"}
+        known.files.get.return_value.decode.return_value = b'{"ok": true}'
+        self.git_util.project_id_map = {"known": MagicMock(id=1)}
+        self.mock_gitlab.projects.get.return_value = known
+        results = {
+            result.project: result
+            for result in self.git_util.get_project_files_with_tag(
+                [("known", "1", "a.json"), ("knwon", "1", "a.json")]
+            )
+        }
+        self.assertEqual(results["known"].content, {"ok": True})
+        self.assertIsNone(results["knwon"].content)
+        self.assertIsInstance(results["knwon"].error, KeyError)
+
+    def test_object_readers_are_bounded(self):
+        with tempfile.TemporaryDirectory() as base:
+            registry = dict()
+            git = ["git", "-c", "user.name=t", "-c", "user.email=t@t"]
+            for i in range(3):
+                repo = os.path.join(base, git_util.DOMAIN_DIRNAME, f"repo{i}")
+                os.makedirs(repo)
+                with open(os.path.join(repo, "a.json"), "w") as f:
+                    f.write(str(i))
+                for argv in (["init", "-q"], ["add", "."], ["commit", "-qm", "c"]):
+                    subprocess.run(git + argv, cwd=repo, check=True)
+                registry[f"repo{i}"] = detail(False, i, f"repo{i}", f"top/repo{i}", "m")
+            self.git_util.base_location = base
+            self.git_util.object_reader_limit = 2
+            self.git_util.project_id_map = registry
+            readers = list()
+            try:
+                for i in range(3):
+                    project = MagicMock(id=i)
+                    self.assertEqual(
+                        self.git_util._read_local_object(project, "HEAD:a.json"),
+                        str(i).encode(),
+                    )
+                    readers.append(self.git_util._object_reader(project))
+                self.assertEqual(len(self.git_util._object_readers), 2)
+                self.assertIsNone(readers[0]._process)
+                self.assertIsNotNone(readers[2]._process)
+            finally:
+                self.git_util.close_object_readers()
+        self.assertIsNone(readers[2]._process)
+
+    @patch("git_action.atexit.register")
+    def test_object_readers_closed_at_exit(self, mock_register):
+        git_util._instance = None
+        instance = git_util(job_token="job", personal_token="token")
+        mock_register.assert_called_once_with(instance.close_object_readers)
+
+    def test_commit_action_size_counts_encoded_bytes(self):
+        file_list = [
+            MagicMock(project_file_path=f"f{i}", content="é" * 100)
+            for i in range(4)
+        ]
+        sized = list(iter_commit_actions(file_list, dict()))
+        for size, file_desc in sized:
+            self.assertGreaterEqual(size, len(json.dumps(file_desc)))
+        chunks = list(chunk_actions(sized, 1300, 200))
+        for chunk in chunks:
+            self.assertLessEqual(len(json.dumps(chunk)), 1300)
+        self.assertEqual(sum(map(len, chunks)), 4)
+
+    def test_file_cache_memory_budget(self):
+        self.git_util.file_cache_memory_bytes = 10
+        self.git_util._file_cache_put(("c1", "a"), b"[1, 2]", persist=False)
+        self.git_util._file_cache_put(("c1", "b"), b"[3, 4]", persist=False)
+        self.assertEqual(list(self.git_util._file_cache), [("c1", "b")])
+        self.git_util._file_cache_put(("c1", "c"), b"[5, 6, 7, 8]", persist=False)
+        self.assertEqual(list(self.git_util._file_cache), [("c1", "b")])
+        self.assertEqual(self.git_util._file_cache_memory, 6)
+        self.git_util.clear_file_cache()
+        self.assertEqual(self.git_util._file_cache_memory, 0)
+
+    def test_git_push_bytes_content(self):
+        self.mock_gitlab.projects.get.return_value = self.mock_project
+        self.mock_project.files.head.return_value = {"X-Gitlab-Blob-Id": "0" * 40}
+        self.git_util.project_id_map = {"test_project": MagicMock(id=123)}
+        self.git_util.add_tag = MagicMock()
+        self.git_util.git_push("test/path", "test_project", b"\x00\xff")
+        _, payload = self.mock_project.files.update.call_args.args
+        self.assertEqual(payload["encoding"], "base64")
+        self.assertEqual(payload["content"], "AP8=")
+        json.dumps(payload)
+
 
 if __name__ == "__main__":
     unittest.main()
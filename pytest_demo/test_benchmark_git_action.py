@@ -0,0 +1,207 @@
+import math
+import os
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import gitlab
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+sys.path.append(str(Path(__file__).parent))
+
+from fake_gitlab import fake_gitlab
+from git_action import git_util
+
+SIZES = [10, 100, 1000]
+LATENCY = float(os.environ.get("FAKE_GITLAB_LATENCY", "0"))
+PER_PAGE = 20
+ROUNDS = 3
+
+
+@pytest.fixture
+def server():
+    with fake_gitlab(latency=LATENCY, default_per_page=PER_PAGE) as fake:
+        fake.add_group(git_util.top_group_id)
+        fake.add_group(git_util.COMMON_GROUP_ID, git_util.top_group_id)
+        fake.add_group(git_util.DOMAIN_GROUP_ID, git_util.top_group_id)
+        yield fake
+
+
+@pytest.fixture
+def util(server, monkeypatch, tmp_path):
+    monkeypatch.setattr(git_util, "git_hostname", server.url)
+    monkeypatch.setattr(git_util, "_instance", None)
+    instance = git_util(job_token="job", personal_token="token")
+    instance.base_location = tmp_path
+    instance.local_read_enabled = False
+    yield instance
+    instance.http_session.close()
+    git_util._instance = None
+
+
+def pages(count):
+    return max(1, math.ceil(count / PER_PAGE))
+
+
+def run_benchmark(benchmark, server, target, setup=None):
+    def reset():
+        if setup is not None:
+            setup()
+        server.reset_calls()
+
+    benchmark.pedantic(target, setup=reset, rounds=ROUNDS, iterations=1)
+    benchmark.extra_info["api_calls"] = server.api_calls
+    benchmark.extra_info["api_calls_by_endpoint"] = dict(server.calls)
+    return server.api_calls
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_fetch_project_id(benchmark, server, util, size):
+    common_count = size // 10
+    for i in range(size):
+        if i < common_count:
+            server.add_project(git_util.COMMON_GROUP_ID, f"Project{i}")
+        else:
+            server.add_project(git_util.DOMAIN_GROUP_ID, f"Project{i}")
+
+    def fetch():
+        util._fetch_project_id(use_cache=False)
+
+    def clear_map():
+        util.project_id_map = dict()
+
+    api_calls = run_benchmark(benchmark, server, fetch, setup=clear_map)
+    assert len(util._project_id_map) == size
+    assert len(util._project_id_map.common()) == common_count
+    assert api_calls == 1 + pages(common_count) + pages(size - common_count)
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_git_push_multi_file(benchmark, server, util, size):
+    project_id = server.add_project(
+        git_util.DOMAIN_GROUP_ID,
+        "Target",
+        files={f"suite/file{i}.json": "{}" for i in range(size)},
+    )
+    util.project_id_map = {"target": MagicMock(id=project_id)}
+    generation = iter(range(1, 10**6))
+
+    def push():
+        round_id = next(generation)
+        file_list = (
+            MagicMock(
+                project_file_path=f"suite/file{i}.json",
+                content=f'{{"round": {round_id}, "file": {i}}}',
+            )
+            for i in range(size)
+        )
+        assert util.git_push_multi_file("target", file_list) == size
+
+    api_calls = run_benchmark(benchmark, server, push)
+    tree_items = size + 1
+    commits = math.ceil(size / util.commit_max_actions)
+    # tree listing + commits + tag listing + tag create
+    assert api_calls == pages(tree_items) + commits + 1 + 1
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_get_next_int_tag(benchmark, server, util, size):
+    project_id = server.add_project(
+        git_util.DOMAIN_GROUP_ID, "Tagged", tags=[*range(1, size + 1), "release"]
+    )
+    project = util.personal_git.projects.get(project_id, lazy=True)
+
+    def next_tag():
+        assert util.get_next_int_tag(project) == size + 1
+
+    api_calls = run_benchmark(benchmark, server, next_tag)
+    assert api_calls == 1
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_get_project_file_with_tag(benchmark, server, util, size):
+    project_id = server.add_project(
+        git_util.DOMAIN_GROUP_ID,
+        "Expectations",
+        files={f"suite/file{i}.json": f'{{"file": {i}}}' for i in range(size)},
+        tags=["1"],
+    )
+    project = util.personal_git.projects.get(project_id, lazy=True)
+
+    def clear_cache():
+        util.clear_file_cache()
+        util._tag_commit_map.clear()
+
+    def read_all():
+        for i in range(size):
+            file_path = f"suite/file{i}.json"
+            result = util.get_project_file_with_tag(project, "1", file_path)
+            assert result == {"file": i}
+
+    api_calls = run_benchmark(benchmark, server, read_all, setup=clear_cache)
+    assert api_calls == 1 + size
+
+
+def test_rate_limit_retry(server, util):
+    server.rate_limit = 2
+    server.retry_after = 1
+    project_id = server.add_project(git_util.DOMAIN_GROUP_ID, "Limited", tags=[1])
+    project = util.personal_git.projects.get(project_id, lazy=True)
+    for _ in range(3):
+        assert util.get_next_int_tag(project) == 2
+    retries = sum(util.http_session.retry_counter.values())
+    assert retries >= 1
+    assert server.api_calls == 3 + retries
+
+
+@pytest.mark.parametrize("size", SIZES[:2])
+def test_publish(benchmark, server, util, size):
+    util.project_id_map = dict()
+    for i in range(size):
+        project_id = server.add_project(git_util.DOMAIN_GROUP_ID, f"Project{i}")
+        util.project_id_map[f"project{i}"] = MagicMock(id=project_id)
+    generation = iter(range(1, 10**6))
+
+    def publish():
+        round_id = next(generation)
+        suite = MagicMock(project_file_path="suite.json", content=f"{round_id}")
+        files = {f"project{i}": [suite] for i in range(size)}
+        reports = util.publish(files, workers=16)
+        assert all(r.error is None and r.tag is not None for r in reports)
+
+    api_calls = run_benchmark(benchmark, server, publish)
+    # tree listing + commit + tag listing + tag create per project
+    assert api_calls == 4 * size
+
+
+def test_git_push_skips_unchanged(server, util):
+    project_id = server.add_project(
+        git_util.DOMAIN_GROUP_ID, "Single", files={"suite.json": "{}"}, tags=[1]
+    )
+    util.project_id_map = {"single": MagicMock(id=project_id)}
+    assert util.git_push("suite.json", "single", "{}") is None
+    assert server.api_calls == 1
+    assert all(key.startswith("HEAD ") for key in server.calls)
+    assert util.git_push("suite.json", "single", '{"a": 1}') == 2
+
+
+def test_persistent_rate_limit_single_retry_layer(server, util, monkeypatch):
+    monkeypatch.setattr(util.http_session, "max_retries", 2)
+    monkeypatch.setattr(util.http_session, "backoff_max", 0.0)
+    server.rate_limit = 0
+    project_id = server.add_project(git_util.DOMAIN_GROUP_ID, "Limited", tags=[1])
+    project = util.personal_git.projects.get(project_id, lazy=True)
+    with pytest.raises(gitlab.exceptions.GitlabListError):
+        util.get_next_int_tag(project)
+    assert server.api_calls == 3
+    assert sum(util.http_session.retry_counter.values()) == 2
+
+
+def test_git_push_bytes_round_trip(server, util):
+    project_id = server.add_project(git_util.DOMAIN_GROUP_ID, "Binary", tags=[1])
+    util.project_id_map = {"binary": MagicMock(id=project_id)}
+    assert util.git_push("blob.bin", "binary", b"\x00\xff") == 2
+    assert server.projects[project_id]["files"]["blob.bin"] == b"\x00\xff"
+    assert util.git_push("blob.bin", "binary", b"\x00\xff") is None
@@ -0,0 +1,175 @@
+import json
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+
+sys.path.append(str(Path(__file__).parent))
+
+from git_action import detail, git_blob_sha
+from git_action_async import async_git_util
+
+
+class TestAsyncGitUtil(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.calls = list()
+        self.routes = dict()
+        self.client = async_git_util(
+            personal_token="mock_personal_token",
+            transport=httpx.MockTransport(self.handler),
+        )
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+
+    def handler(self, request: httpx.Request):
+        key = (request.method, request.url.raw_path.decode().split("?")[0])
+        self.calls.append((key, request))
+        route = self.routes.get(key)
+        if route is None:
+            return httpx.Response(404, json={"message": "404 Not Found"})
+        if callable(route):
+            return route(request)
+        return route
+
+    async def test_fetch_project_id(self):
+        self.routes[("GET", "/api/v4/groups/181186/subgroups")] = httpx.Response(
+            200, json=[{"id": 181187}, {"id": 181188}]
+        )
+        self.routes[("GET", "/api/v4/groups/181187/projects")] = httpx.Response(
+            200,
+            json=[
+                {
+                    "id": 1,
+                    "name": "Common",
+                    "path_with_namespace": "top/common",
+                    "http_url_to_repo": "mock",
+                }
+            ],
+        )
+
+        def domain_projects(request):
+            page = request.url.params["page"]
+            headers = {"X-Next-Page": "2" if page == "1" else ""}
+            project = {
+                "id": int(page) + 1,
+                "name": f"Domain{page}",
+                "path_with_namespace": f"top/domain{page}",
+                "http_url_to_repo": "mock",
+            }
+            return httpx.Response(200, json=[project], headers=headers)
+
+        self.routes[("GET", "/api/v4/groups/181188/projects")] = domain_projects
+        await self.client._fetch_project_id()
+        self.assertTrue(self.client.project_id_map["common"].is_common)
+        self.assertEqual(self.client.project_id_map["domain2"].id, 3)
+
+    async def test_add_tag_conflict(self):
+        self.routes[("GET", "/api/v4/projects/5/repository/tags")] = httpx.Response(
+            200, json=[{"name": "release"}, {"name": "4"}]
+        )
+        created = list()
+
+        def create_tag(request):
+            body = json.loads(request.content)
+            created.append(body["tag_name"])
+            if body["tag_name"] == "5":
+                return httpx.Response(400, json={"message": "Tag 5 already exists"})
+            return httpx.Response(201, json={"name": body["tag_name"]})
+
+        self.routes[("POST", "/api/v4/projects/5/repository/tags")] = create_tag
+        self.assertEqual(await self.client.add_tag(5), 6)
+        self.assertEqual(created, ["5", "6"])
+
+    async def test_git_push_unchanged(self):
+        self.client.project_id_map = {
+            "proj": detail(False, 5, "proj", "top/proj", "mock")
+        }
+        self.routes[("HEAD", "/api/v4/projects/5/repository/files/a%2Fb.json")] = (
+            httpx.Response(200, headers={"X-Gitlab-Blob-Id": git_blob_sha(b"{}")})
+        )
+        result = await self.client.git_push("a/b.json", "proj", "{}")
+        self.assertIsNone(result)
+        self.assertEqual([key[0] for key, _ in self.calls], ["HEAD"])
+
+    async def test_git_push_multi_file(self):
+        self.client.project_id_map = {
+            "proj": detail(False, 5, "proj", "top/proj", "mock")
+        }
+        self.routes[("GET", "/api/v4/projects/5/repository/tree")] = httpx.Response(
+            200,
+            json=[
+                {"path": "same", "type": "blob", "id": git_blob_sha(b"same")},
+                {"path": "old", "type": "blob", "id": "0" * 40},
+            ],
+        )
+        self.routes[("POST", "/api/v4/projects/5/repository/commits")] = (
+            httpx.Response(201, json={})
+        )
+        self.routes[("GET", "/api/v4/projects/5/repository/tags")] = httpx.Response(
+            200, json=[]
+        )
+        self.routes[("POST", "/api/v4/projects/5/repository/tags")] = httpx.Response(
+            201, json={}
+        )
+        file_list = [
+            MagicMock(project_file_path="same", content="same"),
+            MagicMock(project_file_path="old", content="new"),
+            MagicMock(project_file_path="added", content="added"),
+        ]
+        committed = await self.client.git_push_multi_file("proj", file_list)
+        self.assertEqual(committed, 2)
+        commit_request = [
+            request
+            for key, request in self.calls
+            if key == ("POST", "/api/v4/projects/5/repository/commits")
+        ][0]
+        actions = json.loads(commit_request.content)["actions"]
+        self.assertEqual(
+            [(a["file_path"], a["action"]) for a in actions],
+            [("old", "update"), ("added", "create")],
+        )
+
+    async def test_get_project_file_with_tag(self):
+        self.routes[("GET", "/api/v4/projects/5/repository/tags/3")] = (
+            httpx.Response(200, json={"commit": {"id": "abc"}})
+        )
+
+        def raw_file(request):
+            self.assertEqual(request.url.params["ref"], "abc")
+            return httpx.Response(200, content=b'{"key": "value"}')
+
+        self.routes[
+            ("GET", "/api/v4/projects/5/repository/files/dir%2Fa.json/raw")
+        ] = raw_file
+        result = await self.client.get_project_file_with_tag(5, "3", "dir/a.json")
+        self.assertEqual(result, {"key": "value"})
+
+    async def test_request_retry_policy(self):
+        responses = [
+            httpx.Response(503),
+            httpx.Response(429, headers={"RateLimit-Reset": "0"}),
+            httpx.Response(200, json=[]),
+        ]
+        self.routes[("GET", "/api/v4/projects/5/repository/tags")] = (
+            lambda request: responses.pop(0)
+        )
+        self.routes[("POST", "/api/v4/projects/5/repository/tags")] = (
+            httpx.Response(503)
+        )
+        with patch("git_action_async.asyncio.sleep", new=AsyncMock()) as sleep:
+            response = await self.client._request("GET", "/projects/5/repository/tags")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(sleep.await_count, 2)
+            self.assertLess(sleep.await_args_list[1].args[0], 0.2)
+            response = await self.client._request(
+                "POST", "/projects/5/repository/tags"
+            )
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(sleep.await_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
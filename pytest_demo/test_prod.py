@@ -1,4 +1,5 @@
 import os
+import tempfile
 from types import new_class
 from pathlib import Path
 import unittest
@@ -13,25 +14,43 @@ class test_prod(TestCase):
         self.assertIsNotNone(prod.BASE_LOCATION)
         self.assertIsNotNone(prod.TEST_LOCATION)
 
-    @patch("prod.Path")
-    @patch("prod.os.path.join")
-    def test_get_dir(self, mock_join, mock_path):
-        mock_base_location = MagicMock()
-        mock_path.return_value.parent.parent = mock_base_location
-        mock_path.return_value.parent = MagicMock()
+    def test_get_dir(self):
+        with tempfile.TemporaryDirectory() as base:
+            for name in ["test1", ".idea", ".pytest_cache"]:
+                os.makedirs(os.path.join(base, "demo", name))
+            Path(base, "demo", "file.py").touch()
+            with patch("prod.BASE_LOCATION", Path(base)):
+                with patch("builtins.print") as mock_print:
+                    prod.get_dir()
+                    prod.get_dir()
+        self.assertEqual([x.name for x in prod.DEMO_LIST], ["test1"])
+        self.assertEqual(mock_print.call_count, 8)
 
-        mock_join.return_value = "/test/demo"
+    def test_scan_dirs_recursive(self):
+        with tempfile.TemporaryDirectory() as base:
+            for sub in ["a/b/c", "a/skip_me/d", "e/f"]:
+                os.makedirs(os.path.join(base, sub))
+            for workers in (None, 4):
+                found = sorted(
+                    os.path.relpath(entry.path, base)
+                    for entry in prod.scan_dirs(
+                        base, ignore=["skip_*"], recursive=True, workers=workers
+                    )
+                )
+                self.assertEqual(found, ["a", "a/b", "a/b/c", "e", "e/f"])
 
-        mock_dir1 = MagicMock()
-        mock_dir1.name = "test1"
-        mock_dir1.is_dir.return_value = True
-        mock_dir2 = MagicMock()
-        mock_dir2.name = ".idea"
-        mock_dir2.is_dir.return_value = True
-
-        mock_path.return_value.iterdir.return_value = [mock_dir1, mock_dir2]
-        prod.get_dir()
-        self.assertEqual(len(prod.DEMO_LIST), 1)
+    def test_scan_dirs_symlink_loop_and_missing(self):
+        with tempfile.TemporaryDirectory() as base:
+            os.makedirs(os.path.join(base, "a", "b"))
+            os.symlink("..", os.path.join(base, "a", "loop"))
+            for workers in (None, 4):
+                found = sorted(
+                    os.path.relpath(entry.path, base)
+                    for entry in prod.scan_dirs(base, recursive=True, workers=workers)
+                )
+                self.assertEqual(found, ["a", "a/b"])
+            missing = os.path.join(base, "missing")
+            self.assertEqual(list(prod.scan_dirs(missing, recursive=True)), [])
 
     def test_show(self):
         with patch("builtins.print") as mock_print:
@@ -40,6 +59,28 @@ class test_prod(TestCase):
             prod.show()
             self.assertTrue(mock_print.called)
 
+    def test_scan_dirs_incremental(self):
+        with tempfile.TemporaryDirectory() as base:
+            root = os.path.join(base, "root")
+            index_file = os.path.join(base, "index.json")
+            os.makedirs(os.path.join(root, "a", "b"))
+            os.makedirs(os.path.join(root, "c"))
+            first = prod.scan_dirs_incremental(root, index_file, recursive=True)
+            self.assertEqual(len(first.added), 3)
+
+            with patch("prod._scan_one") as mock_scan:
+                second = prod.scan_dirs_incremental(root, index_file, recursive=True)
+                mock_scan.assert_not_called()
+            self.assertEqual((second.added, second.removed), ([], []))
+            self.assertEqual(sorted(second.dirs), sorted(first.dirs))
+
+            os.rmdir(os.path.join(root, "a", "b"))
+            os.makedirs(os.path.join(root, "a", "d"))
+            prod._INDEX_CACHE.clear()
+            third = prod.scan_dirs_incremental(root, index_file, recursive=True)
+            self.assertEqual(third.added, [os.path.join(root, "a", "d")])
+            self.assertEqual(third.removed, [os.path.join(root, "a", "b")])
+
 
 if __name__ == "__main__":
     unittest.main()
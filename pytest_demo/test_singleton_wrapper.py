@@ -0,0 +1,153 @@
+import asyncio
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import TestCase
+
+sys.path.append(str(Path(__file__).parent))
+from singleton_wrapper import singleton_wrapper
+
+
+class test_singleton_wrapper(TestCase):
+    def test_single_instance_under_threads(self):
+        created = list()
+
+        @singleton_wrapper
+        class Slow:
+            def __init__(self):
+                time.sleep(0.05)
+                created.append(self)
+
+        results = list()
+        threads = [
+            threading.Thread(target=lambda: results.append(Slow())) for _ in range(8)
+        ]
+        list(map(lambda t: t.start(), threads))
+        list(map(lambda t: t.join(), threads))
+        self.assertEqual(len(created), 1)
+        self.assertTrue(all(r is created[0] for r in results))
+        self.assertEqual(Slow.cache_info().misses, 1)
+        self.assertEqual(Slow.cache_info().hits, 7)
+
+    def test_different_arguments_warn(self):
+        @singleton_wrapper
+        class Named:
+            def __init__(self, name):
+                self.name = name
+
+        first = Named("Alice")
+        with self.assertWarns(UserWarning):
+            second = Named("Bob")
+        self.assertIs(first, second)
+
+    def test_keyed_lru(self):
+        @singleton_wrapper(keyed=True, maxsize=2)
+        class Named:
+            def __init__(self, name):
+                self.name = name
+
+        alice = Named("Alice")
+        self.assertIs(Named("Alice"), alice)
+        bob = Named("Bob")
+        Named("Alice")
+        Named("Carol")
+        self.assertIsNot(Named("Bob"), bob)
+        self.assertEqual(Named.cache_info().currsize, 2)
+        Named.reset()
+        self.assertEqual(Named.cache_info().currsize, 0)
+        self.assertIsNot(Named("Alice"), alice)
+
+    def test_keyed_construction_is_concurrent(self):
+        @singleton_wrapper(keyed=True)
+        class Slow:
+            def __init__(self, key):
+                time.sleep(0.2)
+
+        threads = [threading.Thread(target=Slow, args=(i,)) for i in range(5)]
+        start = time.perf_counter()
+        list(map(lambda t: t.start(), threads))
+        list(map(lambda t: t.join(), threads))
+        self.assertLess(time.perf_counter() - start, 0.6)
+        self.assertEqual(Slow.cache_info().misses, 5)
+
+    def test_nested_construction(self):
+        @singleton_wrapper(keyed=True)
+        class Node:
+            def __init__(self, depth):
+                self.child = Node(depth - 1) if depth else None
+
+        root = Node(2)
+        self.assertIs(root.child, Node(1))
+        self.assertIs(root.child.child, Node(0))
+
+    def test_failed_construction_is_retried(self):
+        attempts = list()
+
+        @singleton_wrapper
+        class Flaky:
+            def __init__(self):
+                attempts.append(1)
+                if len(attempts) == 1:
+                    raise ValueError("first attempt")
+
+        with self.assertRaises(ValueError):
+            Flaky()
+        self.assertIsNotNone(Flaky())
+        self.assertEqual(len(attempts), 2)
+
+    def test_reset_during_construction(self):
+        started, release = threading.Event(), threading.Event()
+
+        @singleton_wrapper
+        class Slow:
+            def __init__(self):
+                started.set()
+                release.wait(5)
+
+        results = list()
+        thread = threading.Thread(target=lambda: results.append(Slow()))
+        thread.start()
+        started.wait(5)
+        Slow.reset()
+        release.set()
+        thread.join()
+        self.assertEqual(Slow.cache_info().currsize, 0)
+        self.assertIsNot(Slow(), results[0])
+
+    def test_elementwise_arguments_do_not_raise(self):
+        class Elementwise:
+            def __eq__(self, other):
+                raise ValueError("truth value is ambiguous")
+
+        @singleton_wrapper
+        class Holder:
+            def __init__(self, value):
+                self.value = value
+
+        value = Elementwise()
+        first = Holder(value)
+        self.assertIs(Holder(value), first)
+        with self.assertWarns(UserWarning):
+            self.assertIs(Holder(Elementwise()), first)
+
+    def test_async_factory(self):
+        calls = list()
+
+        @singleton_wrapper
+        async def make_client():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return object()
+
+        async def main():
+            return await asyncio.gather(*(make_client() for _ in range(5)))
+
+        results = asyncio.run(main())
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(r is results[0] for r in results))
+
+
+if __name__ == "__main__":
+    unittest.main()